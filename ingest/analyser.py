@@ -2,4 +2,247 @@
 
 The goal is to take raw data as input and identify action items
 with date, time, and place.
+
+extract() scans a text once with a single precompiled pattern that matches
+phone numbers, congressional offices, dates, times, street addresses and
+call-to-action verbs; the verb and office keyword lists are compiled into
+trie-shaped regular expressions, so matching a keyword costs one pass over
+the text however many keywords there are. extract_batch() runs it over many
+documents, optionally in worker processes, and extract_frame() over the
+DESCRIPTION column of scraped events.
+
+Typical Usage:
+    python analyser.py                      # benchmark on scraped_data/
+    python analyser.py --processes 4 --repeat 3
 """
+from multiprocessing import Pool
+import argparse
+import ast
+import glob
+import os
+import re
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRAPED_DATA = os.path.join(HERE, 'web_scraper', 'scraped_data')
+MAIL_DATA = os.path.join(HERE, 'mail_data')
+
+#  verbs that start an action item
+ACTION_VERBS = ('act', 'ask', 'attend', 'boycott', 'call', 'canvass',
+                'contact', 'demand', 'donate', 'email', 'fax', 'join',
+                'knock', 'march', 'organize', 'petition', 'phone', 'protest',
+                'rally', 'register', 'resist', 'rsvp', 'share', 'show up',
+                'sign', 'speak up', 'stand up', 'support', 'tell', 'testify',
+                'text', 'tweet', 'urge', 'visit', 'volunteer', 'vote',
+                'write')
+#  titles of elected officials, followed by a name
+OFFICE_TITLES = ('congressman', 'congresswoman', 'congressperson', 'gov',
+                 'gov.', 'governor', 'rep', 'rep.', 'representative', 'sen',
+                 'sen.', 'senator')
+#  offices named without a person
+OFFICE_NAMES = ('capitol switchboard', 'congressional office',
+                'district office', 'house of representatives',
+                'member of congress', 'members of congress', 'state capitol',
+                'u.s. senate', 'us senate')
+STREET_SUFFIXES = ('ave', 'avenue', 'blvd', 'boulevard', 'cir', 'circle',
+                   'ct', 'court', 'dr', 'drive', 'hwy', 'highway', 'ln',
+                   'lane', 'pkwy', 'parkway', 'pl', 'place', 'plaza', 'rd',
+                   'road', 'sq', 'square', 'st', 'street', 'ter', 'terrace',
+                   'way')
+MONTHS = ('jan', 'january', 'feb', 'february', 'mar', 'march', 'apr',
+          'april', 'may', 'jun', 'june', 'jul', 'july', 'aug', 'august',
+          'sep', 'sept', 'september', 'oct', 'october', 'nov', 'november',
+          'dec', 'december')
+WEEKDAYS = ('mon', 'monday', 'tue', 'tues', 'tuesday', 'wed', 'wednesday',
+            'thu', 'thur', 'thurs', 'thursday', 'fri', 'friday', 'sat',
+            'saturday', 'sun', 'sunday')
+#  kinds of matches, in the order they are tried at each position
+KINDS = ('phones', 'addresses', 'dates', 'times', 'offices', 'actions')
+
+
+def trie_regex(words):
+    """Return a regular expression matching any of words, shaped like a trie
+    of the words, e.g. ['call', 'calls', 'canvass'] -> 'ca(?:ll(?:s)?|nvass)'.
+
+    Unlike a plain alternation, the regex engine never tries more than one
+    branch per character, so matching hardly slows down as words are added.
+    """
+    trie = dict()
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, dict())
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else \
+            '(?:{})'.format('|'.join(branches))
+        if '' in node:
+            pattern = '(?:{})?'.format(pattern)
+        return pattern
+
+    return build(trie)
+
+
+_MONTH = trie_regex(MONTHS)
+_WEEKDAY = trie_regex(WEEKDAYS)
+_CLOCK = r'\d{1,2}(?::\d{2})?\s*[ap]\.?m\b\.?'
+_PATTERNS = {
+    'phones': r'(?<![\w-])(?:\+?1[\s.-]?)?(?:\(\d{3}\)\s?|\d{3}[\s.-])'
+              r'\d{3}[\s.-]\d{4}(?![\w-])',
+    'addresses': r'\b\d{1,6}\s+(?:[NSEW]\.?\s+)?(?:[A-Z0-9][\w\'.-]*\s+){1,4}'
+                 r'(?i:' + trie_regex(STREET_SUFFIXES) + r')\b\.?'
+                 r'(?:,?\s+(?i:suite|ste\.?|#)\s*\w+)?'
+                 r'(?:,\s*[A-Z][A-Za-z]+(?:\s[A-Z][A-Za-z]+)*)?'
+                 r'(?:,\s*[A-Z]{2}\b(?:\s+\d{5})?)?',
+    'dates': r'(?i:\b(?:' + _WEEKDAY + r')\b\.?,?\s+)?'
+             r'(?i:\b(?:' + _MONTH + r')\b\.?\s+\d{1,2}(?:st|nd|rd|th)?\b'
+             r'(?:,?\s+\d{4}\b)?)'
+             r'|\b\d{1,2}/\d{1,2}(?:/(?:\d{4}|\d{2}))?\b'
+             r'|\b\d{4}-\d{2}-\d{2}\b',
+    'times': r'(?i:\b' + _CLOCK + r'(?:\s*(?:-|\u2013|to)\s*' + _CLOCK +
+             r')?|\b(?:noon|midnight)\b)',
+    'offices': r'(?i:\b(?:' + trie_regex(OFFICE_TITLES) + r'))\s+'
+               r'(?:[A-Z][a-z]+\s+){0,2}[A-Z][a-z\'-]+'
+               r'|(?i:\b(?:' + trie_regex(OFFICE_NAMES) + r')\b)',
+    'actions': r'(?i:\b(?:' + trie_regex(ACTION_VERBS) + r')\b)',
+}
+#  one pattern with a named group per kind, so a text is scanned only once;
+#  every kind starts at the start of a word (or at a '(' or '+' of a phone
+#  number), which is checked first so positions inside words fail fast
+PATTERN = re.compile(r'(?<!\w)(?=[\w(+])(?:{})'.format(
+    '|'.join('(?P<{}>{})'.format(kind, _PATTERNS[kind]) for kind in KINDS)))
+
+
+def _normalize(kind, value):
+    value = ' '.join(value.split())
+    if kind == 'phones':
+        digits = re.sub(r'\D', '', value)[-10:]
+        return '{}-{}-{}'.format(digits[:3], digits[3:6], digits[6:])
+    if kind == 'actions':
+        return value.lower()
+    return value.rstrip('.,')
+
+
+def extract(text):
+    """Find action items in text.
+
+    Parameters
+    ----------
+    text : str
+        Description of an event or body of an email.
+
+    Returns
+    -------
+    items : dict
+        Maps each of KINDS to the list of values found in text, in order of
+        appearance. Phone numbers are formatted as 202-224-3121 and action
+        verbs are lower case.
+    """
+    items = {kind: [] for kind in KINDS}
+    if not text:
+        return items
+    for match in PATTERN.finditer(text):
+        kind = match.lastgroup
+        items[kind].append(_normalize(kind, match.group(kind)))
+    return items
+
+
+def as_text(value):
+    """Return a DESCRIPTION value as text, decoding the bytes reprs
+    (b'...') some snapshots hold, or '' if it is missing.
+    """
+    if value is None or value != value:
+        return ''
+    if isinstance(value, str) and value[:2] in ("b'", 'b"') and \
+            value[-1:] == value[1]:
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+def extract_batch(texts, processes=None, chunksize=256):
+    """Run extract() over texts.
+
+    Parameters
+    ----------
+    texts : iterable
+        Texts (or DESCRIPTION values, see as_text()) to analyze.
+    processes : int, default None
+        Number of worker processes, if None texts are analyzed in this
+        process.
+    chunksize : int, default 256
+        Number of texts sent to a worker at a time.
+
+    Returns
+    -------
+    items : list
+        Output of extract() for each text.
+    """
+    texts = [as_text(t) for t in texts]
+    if not processes:
+        return [extract(t) for t in texts]
+    with Pool(processes) as pool:
+        return pool.map(extract, texts, chunksize=chunksize)
+
+
+def extract_frame(events_df, column='DESCRIPTION', processes=None):
+    """Return the action items of each event of events_df.
+
+    Returns
+    -------
+    items_df : DataFrame
+        One upper case column per kind (PHONES, ADDRESSES, DATES, TIMES,
+        OFFICES, ACTIONS) holding lists, with the index of events_df.
+    """
+    import pandas as pd
+    items = extract_batch(events_df[column].tolist(), processes)
+    return pd.DataFrame({kind.upper(): [i[kind] for i in items]
+                         for kind in KINDS}, index=events_df.index)
+
+
+def load_corpus(directory=SCRAPED_DATA, mail_directory=MAIL_DATA):
+    """Return the DESCRIPTIONs of every snapshot in directory and the text of
+    every email logged in mail_directory.
+    """
+    import pandas as pd
+    texts = []
+    for fname in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+        texts.extend(pd.read_csv(fname, usecols=['DESCRIPTION'])
+                     ['DESCRIPTION'].tolist())
+    if os.path.isdir(mail_directory):
+        from scraper import MailLog
+        texts.extend(r.get('text') for r in MailLog.read(mail_directory))
+    return texts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark action item extraction on scraped data.')
+    parser.add_argument('--directory', default=SCRAPED_DATA)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    corpus = [as_text(t) for t in load_corpus(args.directory)]
+    size = sum(len(t) for t in corpus) / 1024 ** 2
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        items = extract_batch(corpus, args.processes)
+    elapsed = (time.perf_counter() - start) / args.repeat
+    print('{} documents ({:.1f} MB) in {:.2f} s: {:.0f} docs/sec, '
+          '{:.1f} MB/s'.format(len(corpus), size, elapsed,
+                               len(corpus) / elapsed, size / elapsed))
+    for kind in KINDS:
+        found = sum(len(i[kind]) for i in items)
+        print('{: <10s} {: >7d} in {} documents'.format(
+            kind, found, sum(1 for i in items if i[kind])))
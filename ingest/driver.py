@@ -0,0 +1,228 @@
+"""
+Ingest emails from several accounts and mailboxes at once.
+
+Every `[Email]` or `[Email:<name>]` section of config.ini is an account, read
+with one EmailParser session per mailbox listed in its `inbox` option. The
+user and password of an account are read from the section of the same name in
+secrets.ini. All sessions run concurrently and put their emails into one
+bounded queue: when the consumer falls behind, the queue fills up and the
+sessions stop fetching until there is room again.
+
+Typical Usage:
+    python driver.py                        # fetch unseen emails once
+    python driver.py --listen               # keep listening for new emails
+"""
+from collections import namedtuple
+from threading import Event, Thread
+import argparse
+import configparser
+import logging
+import os
+import queue
+
+from listener import AllowList, EmailListener, EmailParser
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONFIG = os.path.join(HERE, 'config.ini')
+SECRETS = os.path.join(HERE, 'secrets.ini')
+
+#  a mailbox of an account, see read_accounts()
+Account = namedtuple('Account', ['name', 'parser', 'query', 'allow',
+                                 'max_part_size'])
+#  an email put in the queue by IngestionDriver
+Email = namedtuple('Email', ['account', 'mailbox', 'message'])
+
+
+def read_accounts(config=CONFIG, secrets=SECRETS):
+    """
+    Read the accounts of config.ini.
+
+    Parameters
+    ----------
+    config : str, default CONFIG
+        Path of the config file.
+    secrets : str, default SECRETS
+        Path of the file holding the `user` and `password` of each account.
+
+    Returns
+    -------
+    accounts : list
+        One Account per mailbox of every account section.
+    """
+    parser = configparser.ConfigParser()
+    parser.read(config)
+    credentials = configparser.ConfigParser()
+    credentials.read(secrets)
+
+    accounts = []
+    for section in parser.sections():
+        if section != 'Email' and not section.startswith('Email:'):
+            continue
+        name = section.partition(':')[2] or 'default'
+        options = parser[section]
+
+        def secret(option):
+            return credentials.get(section, option,
+                                   fallback=options.get(option))
+
+        port = options.get('port')
+        allow = AllowList.from_config(config, section)
+        for mailbox in options.get('inbox', 'INBOX').split(','):
+            accounts.append(Account(
+                name=name,
+                parser=EmailParser(options.get('provider'), mailbox.strip(),
+                                   secret('user'), secret('password'),
+                                   port=int(port) if port else None,
+                                   ssl=options.getboolean('ssl',
+                                                          fallback=True)),
+                query=options.get('data items', '(RFC822)'),
+                allow=allow if allow.senders or allow.subjects else None,
+                max_part_size=options.getint('max part size',
+                                             fallback=65536)))
+    return accounts
+
+
+class IngestionDriver(object):
+    """
+    Fetch emails of several accounts concurrently into one bounded queue.
+
+    Parameters
+    ----------
+    accounts : list
+        Accounts returned by read_accounts().
+    maxsize : int, default 1000
+        Maximum number of emails waiting in the queue.
+    batch_size : int, default 100
+        Number of emails fetched per command.
+    header_first : bool, default False
+        If True emails are read with EmailParser.GetEmailParts(), so only
+        the text parts of emails passing each account's allow-list are
+        fetched. Otherwise the `data items` of the account are fetched with
+        GetEmails().
+    listen : bool, default False
+        If True every session keeps listening for new emails (see
+        listener.EmailListener) until stop() is called, otherwise it stops
+        once the unseen emails are fetched.
+    """
+    def __init__(self, accounts, maxsize=1000, batch_size=100,
+                 header_first=False, listen=False):
+        self.accounts = list(accounts)
+        self.queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.header_first = header_first
+        self.listen = listen
+        self._stop = Event()
+        self._threads = []
+        self._listeners = []
+
+    def _put(self, email):
+        """
+        Put email in the queue, waiting while it is full.
+        """
+        while not self._stop.is_set():
+            try:
+                self.queue.put(email, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def _fetch(self, account):
+        parser = account.parser
+        try:
+            if self.header_first:
+                messages = parser.GetEmailParts(
+                    allow=account.allow, batch_size=self.batch_size,
+                    max_part_size=account.max_part_size)
+            else:
+                messages = parser.GetEmails(query=account.query,
+                                            batch_size=self.batch_size)
+            for message in messages:
+                if self._stop.is_set():
+                    messages.close()
+                    break
+                self._put(Email(account.name, parser.mailbox, message))
+        except Exception:
+            logging.exception('Failed to fetch emails of {} ({})'.format(
+                account.name, parser.mailbox))
+        finally:
+            self._put(None)
+
+    def _callback(self, account):
+        def put(message):
+            self._put(Email(account.name, account.parser.mailbox, message))
+        return put
+
+    def _fetch_parts(self, account):
+        def fetch(conn):
+            return account.parser.FetchEmailParts(
+                conn, allow=account.allow, batch_size=self.batch_size,
+                max_part_size=account.max_part_size)
+        return fetch
+
+    def start(self):
+        """
+        Start one session per account.
+        """
+        self._stop.clear()
+        for account in self.accounts:
+            if self.listen:
+                fetch = self._fetch_parts(account) if self.header_first \
+                    else None
+                listener = EmailListener(account.parser,
+                                         callback=self._callback(account),
+                                         query=account.query,
+                                         batch_size=self.batch_size,
+                                         fetch=fetch)
+                self._listeners.append(listener.start())
+            else:
+                thread = Thread(target=self._fetch, args=(account,),
+                                daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """
+        Stop every session.
+        """
+        self._stop.set()
+        for listener in self._listeners:
+            listener.stop()
+        for thread in self._threads:
+            thread.join()
+        self._listeners = []
+        self._threads = []
+
+    def __iter__(self):
+        """
+        Yield Emails from the queue as the sessions fetch them, until every
+        session is done (or forever when listening).
+        """
+        running = len(self._threads)
+        while running or self._listeners:
+            email = self.queue.get()
+            if email is None:
+                running -= 1
+                continue
+            yield email
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Fetch emails of every account in config.ini.')
+    parser.add_argument('--config', default=CONFIG)
+    parser.add_argument('--secrets', default=SECRETS)
+    parser.add_argument('--listen', action='store_true')
+    parser.add_argument('--header-first', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    driver = IngestionDriver(read_accounts(args.config, args.secrets),
+                             header_first=args.header_first,
+                             listen=args.listen).start()
+    try:
+        for email in driver:
+            print(email.account, email.mailbox, email.message)
+    finally:
+        driver.stop()
@@ -0,0 +1,609 @@
+"""
+Local stand-in IMAP server for trying EmailParser without a real mailbox.
+
+It speaks enough plain-text IMAP4rev1 (LOGIN, SELECT, SEARCH, FETCH with
+ENVELOPE, BODYSTRUCTURE and partial BODY[section]<origin.size> items, STORE
+and their UID variants, plus IDLE) for imaplib, keeps its mailboxes in
+memory, and can add a delay to every command to mimic the round trip to a
+remote server. Messages delivered while a client is selected are announced
+with EXISTS responses, pushed during IDLE or returned with NOOP.
+
+Typical Usage:
+    python imapserver.py --messages 2000 --latency 0.05
+    python listener.py --host 127.0.0.1 --port 1143 --no-ssl --batch-size 500
+"""
+from email import message_from_bytes
+from email.message import EmailMessage
+from email.utils import format_datetime, getaddresses, make_msgid
+import argparse
+import datetime
+import re
+import select
+import socket
+import socketserver
+import threading
+import time
+
+
+def sample_messages(n, attachment_size=0):
+    """
+    Return n synthetic action-newsletter emails as RFC822 bytes.
+
+    Parameters
+    ----------
+    n : int
+        Number of messages.
+    attachment_size : int, default 0
+        Size in bytes of a binary attachment added to every message, 0 adds
+        none.
+    """
+    start = datetime.datetime(2017, 6, 1, 9, 0,
+                              tzinfo=datetime.timezone.utc)
+    messages = []
+    for i in range(n):
+        msg = EmailMessage()
+        msg['From'] = 'Action Team {0} <actions{0}@example.org>'.format(i % 5)
+        msg['To'] = 'indivisible@example.org'
+        msg['Subject'] = 'Action alert #{}: call your representative'.format(i)
+        msg['Date'] = format_datetime(start + datetime.timedelta(minutes=i))
+        msg['Message-ID'] = make_msgid('action{}'.format(i), 'example.org')
+        text = ('Call your representative about bill HR-{0} before '
+                'Friday.\nhttps://example.org/actions/{0}\n').format(i)
+        msg.set_content(text)
+        msg.add_alternative('<html><body><p>{}</p></body></html>'.format(
+            text.replace('\n', '<br>')), subtype='html')
+        if attachment_size:
+            msg.add_attachment(bytes(attachment_size), maintype='image',
+                               subtype='png', filename='banner.png')
+        messages.append(msg.as_bytes())
+    return messages
+
+
+def parse_arguments(text):
+    """
+    Split IMAP command arguments into atoms, strings and nested lists.
+
+    Brackets are kept inside atoms, so `BODY.PEEK[HEADER.FIELDS (FROM)]` is
+    a single atom.
+    """
+    tokens = []
+    stack = []
+    current = tokens
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == ' ':
+            i += 1
+        elif c == '(':
+            stack.append(current)
+            current.append([])
+            current = current[-1]
+            i += 1
+        elif c == ')':
+            current = stack.pop()
+            i += 1
+        elif c == '"':
+            j = i + 1
+            chars = []
+            while text[j] != '"':
+                if text[j] == '\\':
+                    j += 1
+                chars.append(text[j])
+                j += 1
+            current.append(''.join(chars))
+            i = j + 1
+        else:
+            j = i
+            depth = 0
+            while j < len(text) and (depth or text[j] not in ' ()'):
+                if text[j] == '[':
+                    depth += 1
+                elif text[j] == ']':
+                    depth -= 1
+                j += 1
+            current.append(text[i:j])
+            i = j
+    return tokens
+
+
+def parse_message_set(message_set, largest):
+    """
+    Return the numbers in an IMAP message set such as '1:5,7,9:*'.
+    """
+    numbers = set()
+    for part in message_set.split(','):
+        first, _, last = part.partition(':')
+        first = largest if first == '*' else int(first)
+        last = first if not last else largest if last == '*' else int(last)
+        if first > last:
+            first, last = last, first
+        numbers.update(range(first, last + 1))
+    return numbers
+
+
+def quote(value):
+    """
+    Return value as an IMAP quoted string, or NIL if value is None.
+    """
+    if value is None:
+        return 'NIL'
+    return '"{}"'.format(str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+
+
+def envelope(message):
+    """
+    Return the ENVELOPE of an email.message.Message.
+    """
+    def addresses(*names):
+        for name in names:
+            values = message.get_all(name)
+            if values:
+                break
+        else:
+            return 'NIL'
+        parts = []
+        for display, address in getaddresses(values):
+            mailbox, _, host = address.partition('@')
+            parts.append('({} NIL {} {})'.format(
+                quote(display or None), quote(mailbox), quote(host or None)))
+        return '({})'.format(''.join(parts))
+
+    return '({} {} {} {} {} {} {} {} {} {})'.format(
+        quote(message['Date']), quote(message['Subject']),
+        addresses('From'), addresses('Sender', 'From'),
+        addresses('Reply-To', 'From'), addresses('To'), addresses('Cc'),
+        addresses('Bcc'), quote(message['In-Reply-To']),
+        quote(message['Message-ID']))
+
+
+def body_structure(part):
+    """
+    Return the BODYSTRUCTURE of an email.message.Message.
+    """
+    if part.is_multipart():
+        return '({} {})'.format(''.join(body_structure(p)
+                                        for p in part.get_payload()),
+                                quote(part.get_content_subtype()))
+    params = ' '.join('{} {}'.format(quote(k), quote(v))
+                      for k, v in part.get_params()[1:])
+    body = section_body(part)
+    fields = '{} {} {} NIL NIL {} {}'.format(
+        quote(part.get_content_maintype()), quote(part.get_content_subtype()),
+        '({})'.format(params) if params else 'NIL',
+        quote(part.get('Content-Transfer-Encoding', '7bit')), len(body))
+    if part.get_content_maintype() == 'text':
+        fields += ' {}'.format(body.count(b'\n'))
+    return '({})'.format(fields)
+
+
+def section_body(part):
+    """
+    Return the encoded body of a leaf part, as sent for BODY[section].
+    """
+    data = part.get_payload().encode('ascii', 'surrogateescape')
+    return data.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+
+
+def find_section(message, section):
+    """
+    Return the part of message numbered section, e.g. '1.2'.
+    """
+    part = message
+    for number in section.split('.'):
+        if part.is_multipart():
+            part = part.get_payload()[int(number) - 1]
+        elif number != '1':
+            raise ValueError('No section {}'.format(section))
+    return part
+
+
+#  BODY[section]<origin.size> fetch items
+BODY_ITEM = re.compile(r'^BODY(\.PEEK)?\[([\d.]*|HEADER|TEXT)\]'
+                       r'(?:<(\d+)\.(\d+)>)?$')
+
+
+class Message(object):
+    """
+    Message stored by the server.
+    """
+    def __init__(self, uid, data, flags=()):
+        self.uid = uid
+        self.data = data
+        self.flags = set(flags)
+        self._parsed = None
+
+    @property
+    def parsed(self):
+        if self._parsed is None:
+            self._parsed = message_from_bytes(self.data)
+        return self._parsed
+
+    @property
+    def header(self):
+        return self.data.split(b'\r\n\r\n', 1)[0] + b'\r\n\r\n' \
+            if b'\r\n\r\n' in self.data else self.data
+
+
+class IMAPServer(socketserver.ThreadingTCPServer):
+    """
+    In-memory IMAP server, see serve_mailbox().
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, user=None, password=None, latency=0.0,
+                 idle=True):
+        super().__init__(address, _IMAPHandler)
+        self.user = user
+        self.password = password
+        self.latency = latency
+        self.idle = idle
+        self.mailboxes = {'INBOX': []}
+        self.uidnext = 1
+        self.lock = threading.Condition()
+        self.commands = 0
+        self.connections = set()
+
+    @property
+    def capabilities(self):
+        return 'IMAP4rev1 IDLE' if self.idle else 'IMAP4rev1'
+
+    def drop_connections(self):
+        """
+        Close every client connection, e.g. to test reconnecting clients.
+        """
+        with self.lock:
+            for conn in list(self.connections):
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def deliver(self, data, mailbox='INBOX', flags=()):
+        """
+        Add a message (RFC822 bytes) to mailbox and return its UID.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        data = data.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+        with self.lock:
+            uid = self.uidnext
+            self.uidnext += 1
+            self.mailboxes.setdefault(mailbox.upper(), []).append(
+                Message(uid, data, flags))
+            self.lock.notify_all()
+        return uid
+
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    """
+    Serve one client connection of an IMAPServer.
+    """
+    #  responses are buffered and flushed once per command
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        self.wfile.write(line + b'\r\n')
+
+    def handle(self):
+        self.selected = None
+        self.exists = 0
+        with self.server.lock:
+            self.server.connections.add(self.connection)
+        try:
+            self._serve()
+        finally:
+            with self.server.lock:
+                self.server.connections.discard(self.connection)
+
+    def _serve(self):
+        self.send('* OK [CAPABILITY {}] IMAP stand-in ready'.format(
+            self.server.capabilities))
+        self.wfile.flush()
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode('utf-8').rstrip('\r\n').partition(' ')
+            command, _, args = rest.partition(' ')
+            command = command.upper()
+            uid = command == 'UID'
+            if uid:
+                command, _, args = args.partition(' ')
+                command = command.upper()
+            self.server.commands += 1
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            if command == 'IDLE' and self.server.idle:
+                if not self.idle(tag):
+                    return
+                continue
+            method = getattr(self, 'do_' + command, None)
+            if method is None:
+                self.send('{} BAD Unknown command {}'.format(tag, command))
+                self.wfile.flush()
+                continue
+            try:
+                with self.server.lock:
+                    status = method(tag, parse_arguments(args), uid)
+            except Exception as e:
+                self.send('{} BAD {}: {}'.format(tag, type(e).__name__, e))
+                self.wfile.flush()
+                continue
+            if status is None:
+                self.wfile.flush()
+                return
+            self.send('{} {}'.format(tag, status))
+            self.wfile.flush()
+
+    @property
+    def messages(self):
+        if self.selected is None:
+            raise ValueError('No mailbox selected')
+        return self.server.mailboxes[self.selected]
+
+    def select_messages(self, message_set, uid):
+        """
+        Return (sequence number, message) pairs in message_set.
+        """
+        messages = self.messages
+        if uid:
+            largest = messages[-1].uid if messages else 0
+            wanted = parse_message_set(message_set, largest)
+            return [(i + 1, m) for i, m in enumerate(messages)
+                    if m.uid in wanted]
+        wanted = parse_message_set(message_set, len(messages))
+        return [(i + 1, m) for i, m in enumerate(messages) if i + 1 in wanted]
+
+    def report_exists(self):
+        """
+        Send an EXISTS response if messages arrived in the selected mailbox.
+        """
+        if self.selected is not None and len(self.messages) != self.exists:
+            self.exists = len(self.messages)
+            self.send('* {} EXISTS'.format(self.exists))
+            return True
+        return False
+
+    def idle(self, tag):
+        """
+        Push EXISTS responses until the client sends DONE. Return False if
+        the connection was closed.
+        """
+        self.send('+ idling')
+        self.wfile.flush()
+        while True:
+            with self.server.lock:
+                if self.report_exists():
+                    self.wfile.flush()
+                self.server.lock.wait(0.01)
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                break
+        self.send('{} OK IDLE terminated'.format(tag))
+        self.wfile.flush()
+        return True
+
+    def do_CAPABILITY(self, tag, args, uid):
+        self.send('* CAPABILITY {}'.format(self.server.capabilities))
+        return 'OK CAPABILITY completed'
+
+    def do_NOOP(self, tag, args, uid):
+        self.report_exists()
+        return 'OK NOOP completed'
+
+    def do_LOGIN(self, tag, args, uid):
+        user, password = args
+        if self.server.user is not None and \
+                (user, password) != (self.server.user, self.server.password):
+            return 'NO [AUTHENTICATIONFAILED] Invalid credentials'
+        return 'OK LOGIN completed'
+
+    def do_LOGOUT(self, tag, args, uid):
+        self.send('* BYE Logging out')
+        self.send('{} OK LOGOUT completed'.format(tag))
+
+    def do_SELECT(self, tag, args, uid):
+        name = args[0].upper()
+        if name not in self.server.mailboxes:
+            return 'NO Mailbox does not exist'
+        self.selected = name
+        self.exists = len(self.messages)
+        self.send('* FLAGS (\\Seen \\Answered \\Flagged \\Deleted \\Draft)')
+        self.send('* {} EXISTS'.format(self.exists))
+        self.send('* 0 RECENT')
+        self.send('* OK [UIDVALIDITY 1] UIDs valid')
+        self.send('* OK [UIDNEXT {}] Predicted next UID'.format(
+            self.server.uidnext))
+        return 'OK [READ-WRITE] SELECT completed'
+
+    do_EXAMINE = do_SELECT
+
+    def do_CLOSE(self, tag, args, uid):
+        self.selected = None
+        return 'OK CLOSE completed'
+
+    def do_SEARCH(self, tag, args, uid):
+        if args and str(args[0]).upper() == 'CHARSET':
+            args = args[2:]
+        found = []
+        for seq, msg in enumerate(self.messages, 1):
+            if self._matches(msg, seq, list(args)):
+                found.append(msg.uid if uid else seq)
+        self.send(' '.join(['* SEARCH'] + [str(n) for n in found]))
+        return 'OK SEARCH completed'
+
+    def _matches(self, msg, seq, keys):
+        """
+        Return True if msg matches all search keys.
+        """
+        from email.parser import BytesHeaderParser
+        headers = None
+        while keys:
+            key = keys.pop(0)
+            if isinstance(key, list):
+                if not self._matches(msg, seq, list(key)):
+                    return False
+                continue
+            key = key.upper()
+            if key == 'ALL':
+                continue
+            elif key in ('SEEN', 'UNSEEN'):
+                if ('\\Seen' in msg.flags) != (key == 'SEEN'):
+                    return False
+            elif key == 'UID':
+                if msg.uid not in parse_message_set(keys.pop(0), msg.uid):
+                    return False
+            elif key in ('FROM', 'TO', 'SUBJECT'):
+                if headers is None:
+                    headers = BytesHeaderParser().parsebytes(msg.header)
+                if keys.pop(0).lower() not in str(headers[key] or '').lower():
+                    return False
+            elif key[0].isdigit() or key[0] == '*':
+                if seq not in parse_message_set(key, len(self.messages)):
+                    return False
+            else:
+                raise ValueError('Unsupported search key {}'.format(key))
+        return True
+
+    def do_FETCH(self, tag, args, uid):
+        message_set, items = args[0], args[1]
+        if not isinstance(items, list):
+            items = [items]
+        items = [i.upper() for i in items]
+        if uid and 'UID' not in items:
+            items.insert(0, 'UID')
+        for seq, msg in self.select_messages(message_set, uid):
+            parts = []
+            for item in items:
+                parts.append(self._fetch_item(msg, item))
+            self.wfile.write('* {} FETCH ('.format(seq).encode('utf-8') +
+                             b' '.join(parts) + b')\r\n')
+        return 'OK FETCH completed'
+
+    def _fetch_item(self, msg, item):
+        """
+        Return the response to FETCH item for msg.
+        """
+        def literal(name, data):
+            return '{} {{{}}}\r\n'.format(name, len(data)).encode('utf-8') + \
+                data
+
+        if item == 'UID':
+            return 'UID {}'.format(msg.uid).encode('utf-8')
+        if item == 'FLAGS':
+            return 'FLAGS ({})'.format(' '.join(sorted(msg.flags))).encode(
+                'utf-8')
+        if item == 'RFC822.SIZE':
+            return 'RFC822.SIZE {}'.format(len(msg.data)).encode('utf-8')
+        if item == 'RFC822':
+            msg.flags.add('\\Seen')
+            return literal(item, msg.data)
+        if item == 'RFC822.HEADER':
+            return literal(item, msg.header)
+        if item == 'ENVELOPE':
+            return 'ENVELOPE {}'.format(envelope(msg.parsed)).encode('utf-8')
+        if item in ('BODY', 'BODYSTRUCTURE'):
+            return '{} {}'.format(item, body_structure(msg.parsed)).encode(
+                'utf-8')
+        match = BODY_ITEM.match(item)
+        if match is None:
+            raise ValueError('Unsupported fetch item {}'.format(item))
+        peek, section, origin, size = match.groups()
+        if not peek:
+            msg.flags.add('\\Seen')
+        if section == '':
+            data = msg.data
+        elif section == 'HEADER':
+            data = msg.header
+        elif section == 'TEXT':
+            data = msg.data[len(msg.header):]
+        else:
+            data = section_body(find_section(msg.parsed, section))
+        name = 'BODY[{}]'.format(section)
+        if origin is not None:
+            data = data[int(origin):int(origin) + int(size)]
+            name += '<{}>'.format(origin)
+        return literal(name, data)
+
+    def do_STORE(self, tag, args, uid):
+        message_set, action, flags = args
+        flags = set(flags if isinstance(flags, list) else [flags])
+        action = action.upper()
+        for seq, msg in self.select_messages(message_set, uid):
+            if action.startswith('+'):
+                msg.flags |= flags
+            elif action.startswith('-'):
+                msg.flags -= flags
+            else:
+                msg.flags = set(flags)
+            if not action.endswith('.SILENT'):
+                self.send('* {} FETCH ({}FLAGS ({}))'.format(
+                    seq, 'UID {} '.format(msg.uid) if uid else '',
+                    ' '.join(sorted(msg.flags))))
+        return 'OK STORE completed'
+
+
+def serve_mailbox(messages=(), host='127.0.0.1', port=0, user=None,
+                  password=None, latency=0.0, idle=True):
+    """
+    Serve an in-memory INBOX over plain IMAP from a background thread.
+
+    Parameters
+    ----------
+    messages : list, default ()
+        RFC822 messages (bytes) delivered to INBOX, e.g. from
+        sample_messages().
+    host : str, default '127.0.0.1'
+        Address to bind to.
+    port : int, default 0
+        Port to bind to, 0 picks a free port.
+    user, password : str, default None
+        Credentials accepted by LOGIN, if None any credentials are accepted.
+    latency : float, default 0.0
+        Seconds every command is delayed by, to mimic a remote server.
+    idle : bool, default True
+        If False the server does not support IDLE.
+
+    Returns
+    -------
+    server, address : tuple
+        The running IMAPServer (call shutdown() to stop it) and the
+        (host, port) it listens on.
+    """
+    server = IMAPServer((host, port), user=user, password=password,
+                        latency=latency, idle=idle)
+    for data in messages:
+        server.deliver(data)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.server_address[:2]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1143)
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--attachment-size', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--no-idle', dest='idle', action='store_false')
+    args = parser.parse_args()
+
+    server = IMAPServer((args.host, args.port), latency=args.latency,
+                        idle=args.idle)
+    for data in sample_messages(args.messages, args.attachment_size):
+        server.deliver(data)
+    print('Serving {} messages on imap://{}:{}'.format(args.messages,
+                                                       args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
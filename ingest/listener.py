@@ -4,50 +4,683 @@ received email
 """
 
 # from Scraper import scrap
-from threading import Thread
+from collections import OrderedDict
+from threading import Event, Thread
+import argparse
+import binascii
+import configparser
 import imaplib
+import logging
+import quopri
+import re
+import select
+import socket
+import ssl
+import time
 # from email import parser
 # def listen_notification():
 #    pass
 
 
+def message_set(numbers):
+    """
+    Return an IMAP message set for numbers, joining consecutive numbers into
+    ranges, e.g. [1, 2, 3, 5] -> '1:3,5'.
+    """
+    numbers = sorted(int(n) for n in numbers)
+    ranges = []
+    for n in numbers:
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ','.join(str(a) if a == b else '{}:{}'.format(a, b)
+                    for a, b in ranges)
+
+
+def split_fetch_response(data):
+    """
+    Split the data of a FETCH of several messages into one list per message,
+    shaped like the data of a FETCH of a single message.
+    """
+    messages = []
+    for item in data:
+        if item is None:
+            continue
+        head = item[0] if isinstance(item, tuple) else item
+        if not messages or re.match(br'\d+ \(', head):
+            messages.append([item])
+        else:
+            messages[-1].append(item)
+    return messages
+
+
+#  tokens of IMAP responses: parentheses, quoted strings, literal markers and
+#  atoms (which may contain a [section] and an <origin>)
+_TOKEN = re.compile(br'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}\s*$|'
+                    br'([^\s()"\[]+(?:\[[^\]]*\][^\s()"]*)?))')
+
+
+def parse_fetch(data):
+    """
+    Parse the FETCH data of one message into a dict of its items, e.g.
+    {'UID': 12, 'ENVELOPE': [...], 'BODY[1]<0>': b'...'}.
+
+    Lists are returned as nested lists of bytes, with NIL as None.
+    """
+    stack = [[]]
+    for item in data:
+        text, literal = item if isinstance(item, tuple) else (item, None)
+        pos = 0
+        while True:
+            match = _TOKEN.match(text, pos)
+            if match is None:
+                break
+            pos = match.end()
+            lparen, rparen, quoted, size, atom = match.groups()
+            if lparen:
+                stack.append([])
+            elif rparen:
+                done = stack.pop()
+                stack[-1].append(done)
+            elif quoted is not None:
+                stack[-1].append(re.sub(br'\\(.)', br'\1', quoted))
+            elif size is not None:
+                stack[-1].append(literal)
+            else:
+                stack[-1].append(None if atom.upper() == b'NIL' else atom)
+    pairs = stack[0][1] if len(stack[0]) > 1 else []
+    items = dict()
+    for key, value in zip(pairs[::2], pairs[1::2]):
+        key = key.decode('ascii').upper()
+        items[key] = int(value) if key in ('UID', 'RFC822.SIZE') else value
+    return items
+
+
+def _text(value):
+    """
+    Decode an ENVELOPE string, including RFC 2047 encoded words.
+    """
+    from email.header import decode_header, make_header
+    if value is None:
+        return None
+    value = value.decode('utf-8', 'replace')
+    try:
+        return str(make_header(decode_header(value)))
+    except (ValueError, LookupError):
+        return value
+
+
+def parse_envelope(envelope):
+    """
+    Return the date, subject, sender, recipients and Message-ID of a parsed
+    ENVELOPE as a dict.
+    """
+    def addresses(values):
+        result = []
+        for name, _, mailbox, host in values or []:
+            if mailbox is None or host is None:
+                continue
+            result.append('{}@{}'.format(_text(mailbox), _text(host)).lower())
+        return result
+
+    date, subject, sender, _, _, to, cc = envelope[:7]
+    senders = addresses(sender)
+    return {'date': _text(date),
+            'subject': _text(subject),
+            'from': senders[0] if senders else None,
+            'to': addresses(to) + addresses(cc),
+            'message_id': _text(envelope[9])}
+
+
+def text_parts(structure, subtypes=('plain', 'html'), section=''):
+    """
+    Find the text parts of a parsed BODYSTRUCTURE.
+
+    Parameters
+    ----------
+    structure : list
+        BODYSTRUCTURE item of parse_fetch().
+    subtypes : tuple, default ('plain', 'html')
+        Subtypes of the text parts to return.
+
+    Returns
+    -------
+    parts : list
+        Dicts with the section number (e.g. '1.2'), subtype, encoding,
+        charset and size of every matching part.
+    """
+    if isinstance(structure[0], list):
+        #  the parts of a multipart come before its subtype
+        parts = []
+        for i, child in enumerate(structure, 1):
+            if not isinstance(child, list):
+                break
+            parts.extend(text_parts(child, subtypes, '{}{}'.format(
+                section + '.' if section else '', i)))
+        return parts
+    maintype, subtype, params, _, _, encoding, size = structure[:7]
+    if maintype.lower() != b'text' or \
+            subtype.decode('ascii').lower() not in subtypes:
+        return []
+    params = dict(zip(*[iter(params or [])] * 2))
+    charset = next((v for k, v in params.items()
+                    if k.lower() == b'charset'), b'utf-8')
+    return [{'section': section or '1',
+             'subtype': subtype.decode('ascii').lower(),
+             'encoding': (encoding or b'7bit').decode('ascii').lower(),
+             'charset': charset.decode('ascii'),
+             'size': int(size)}]
+
+
+def decode_part(data, encoding, charset):
+    """
+    Decode the body of a part, which may have been cut short by a partial
+    fetch.
+    """
+    if encoding == 'base64':
+        data = re.sub(br'[^A-Za-z0-9+/=]', b'', data)
+        data = binascii.a2b_base64(data[:len(data) // 4 * 4])
+    elif encoding == 'quoted-printable':
+        data = quopri.decodestring(data)
+    try:
+        return data.decode(charset, 'replace')
+    except LookupError:
+        return data.decode('utf-8', 'replace')
+
+
+class AllowList(object):
+    """
+    Senders and subjects of the emails worth fetching.
+
+    Parameters
+    ----------
+    senders : list, default ()
+        Allowed sender addresses; entries starting with '@' allow a whole
+        domain. If empty every sender is allowed.
+    subjects : list, default ()
+        Allowed subjects, matched as case-insensitive substrings. If empty
+        every subject is allowed.
+    """
+    def __init__(self, senders=(), subjects=()):
+        self.senders = [s.strip().lower() for s in senders if s.strip()]
+        self.subjects = [s.strip().lower() for s in subjects if s.strip()]
+
+    @classmethod
+    def from_config(cls, path='config.ini', section='Email'):
+        """
+        Read the comma separated `allowed senders` and `allowed subjects`
+        options of section in the config file at path.
+        """
+        config = configparser.ConfigParser()
+        config.read(path)
+        senders = config.get(section, 'allowed senders', fallback='')
+        subjects = config.get(section, 'allowed subjects', fallback='')
+        return cls(senders.split(','), subjects.split(','))
+
+    def matches(self, envelope):
+        """
+        Return True if the email of a parse_envelope() dict is allowed.
+        """
+        sender = envelope.get('from') or ''
+        subject = (envelope.get('subject') or '').lower()
+        if self.senders and not any(
+                sender == s or (s.startswith('@') and sender.endswith(s))
+                for s in self.senders):
+            return False
+        if self.subjects and not any(s in subject for s in self.subjects):
+            return False
+        return True
+
+
+def _buffered(conn):
+    """
+    Return True if data from the server is waiting in the read buffer of
+    conn, without blocking.
+    """
+    timeout = conn.sock.gettimeout()
+    conn.sock.setblocking(False)
+    try:
+        return bool(conn.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        conn.sock.settimeout(timeout)
+
+
+def idle(conn, timeout, stop=None):
+    """
+    Wait in IMAP IDLE until the server pushes a response, timeout seconds
+    pass or stop is set.
+
+    imaplib has no IDLE support, so the command is sent and its responses
+    are read on the connection directly.
+
+    Parameters
+    ----------
+    conn : imaplib.IMAP4
+        Connection with a selected mailbox, whose server supports IDLE.
+    timeout : float
+        Seconds to wait at most.
+    stop : threading.Event, default None
+        Event ending the wait early, checked every second.
+
+    Returns
+    -------
+    responses : list
+        Untagged responses pushed by the server, e.g. [b'* 12 EXISTS'].
+    """
+    tag = conn._new_tag()
+    conn.send(tag + b' IDLE\r\n')
+    line = conn.readline()
+    if not line:
+        raise conn.abort('Connection closed during IDLE')
+    if not line.startswith(b'+'):
+        raise conn.error('IDLE failed: {}'.format(line))
+    responses = []
+    deadline = time.monotonic() + timeout
+    while not responses and (stop is None or not stop.is_set()):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if not _buffered(conn):
+            readable, _, _ = select.select([conn.sock], [], [],
+                                           min(remaining, 1.0))
+            if not readable:
+                continue
+        line = conn.readline()
+        if not line:
+            raise conn.abort('Connection closed during IDLE')
+        responses.append(line.rstrip(b'\r\n'))
+    conn.send(b'DONE\r\n')
+    while True:
+        line = conn.readline()
+        if not line:
+            raise conn.abort('Connection closed during IDLE')
+        if line.startswith(tag):
+            break
+        responses.append(line.rstrip(b'\r\n'))
+    if not line.startswith(tag + b' OK'):
+        raise conn.error('IDLE failed: {}'.format(line))
+    return responses
+
+
 class EmailParser(object):
-    def __init__(self, host, mailbox, user, password):
+    def __init__(self, host, mailbox, user, password, port=None, ssl=True):
         self.host = host
         self.user = user
         self.password = password
         self.mailbox = mailbox
+        self.port = port
+        self.ssl = ssl
 
-    def GetEmails(self, search_filter='UNSEEN', query='(RFC822)', n=None):
+    def connect(self):
+        """
+        Open a connection, log in and select the mailbox.
+        """
+        imap = imaplib.IMAP4_SSL if self.ssl else imaplib.IMAP4
+        port = self.port or (imaplib.IMAP4_SSL_PORT if self.ssl
+                             else imaplib.IMAP4_PORT)
+        conn = imap(self.host, port)
+        #  send short commands (e.g. DONE after IDLE) without delay
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.login(self.user, self.password)
+        conn.select(self.mailbox)
+        return conn
+
+    def GetEmails(self, search_filter='UNSEEN', query='(RFC822)', n=None,
+                  batch_size=None):
+        """
+        Yield the FETCH data of the messages matching search_filter and mark
+        them as seen.
+
+        By default every message takes two round trips (FETCH and STORE).
+        With batch_size the messages are searched by UID and fetched, and
+        marked as seen, batch_size at a time with one UID FETCH and one UID
+        STORE per batch, while still being yielded one by one. A batch is
+        marked once its messages have been yielded, and only up to the last
+        one yielded if the consumer stops early. The server marks messages
+        read with (RFC822) itself; query (BODY.PEEK[]) leaves the rest
+        unseen.
+
+        Parameters
+        ----------
+        search_filter : str, default 'UNSEEN'
+            IMAP search criteria.
+        query : str, default '(RFC822)'
+            IMAP fetch items.
+        n : int, default None
+            Maximum number of messages, if None all matching messages.
+        batch_size : int, default None
+            Number of messages fetched per command, if None one at a time.
+        """
+        conn = None
         try:
-            conn = imaplib.IMAP4_SSL(self.host)
-            conn.login(self.user, self.password)
-            conn.select(self.mailbox)
+            conn = self.connect()
+            for message in self.FetchEmails(conn, search_filter, query, n,
+                                            batch_size):
+                yield message
+        finally:
+            if conn is not None:
+                conn.close()
+                conn.logout()
+
+    def FetchEmails(self, conn, search_filter='UNSEEN', query='(RFC822)',
+                    n=None, batch_size=None):
+        """
+        Same as GetEmails(), on an open connection returned by connect().
+        """
+        if batch_size:
+            rv, data = conn.uid('SEARCH', None, search_filter)
+        else:
             rv, data = conn.search(None, search_filter)
-            if rv != 'OK':
-                # TODO timestamp message, or just implement actual logging...
-                print('No messages found!\n')
-                return
-            labels = data[0].split()
-            count = len(labels)
-            n = count if n is None else n
-            n = min(n, count)
-
-            for num in labels[:n]:
-                rv, result = conn.fetch(num, query)
+        if rv != 'OK':
+            # TODO timestamp message, or just implement actual logging...
+            print('No messages found!\n')
+            return
+        labels = data[0].split()
+        count = len(labels)
+        n = count if n is None else n
+        n = min(n, count)
+
+        if batch_size:
+            for i in range(0, n, batch_size):
+                uids = message_set(labels[i:min(i + batch_size, n)])
+                rv, result = conn.uid('FETCH', uids, query)
                 if rv != 'OK':
-                    raise RuntimeError('Failed to fetch message {}'
-                                       .format(num))
+                    raise RuntimeError('Failed to fetch messages {}'
+                                       .format(uids))
+
+                #  only mark the messages handed out, so those left unread
+                #  when the consumer stops are fetched again
+                yielded = []
+                try:
+                    for message in split_fetch_response(result):
+                        yielded.append(parse_fetch(message)['UID'])
+                        yield message
+                finally:
+                    if yielded:
+                        conn.uid('STORE', message_set(yielded),
+                                 '+FLAGS.SILENT', '(\\Seen)')
+            return
 
-                seen_rv, seen_data = conn.store(num, '+FLAGS', '\\Seen')
+        for num in labels[:n]:
+            rv, result = conn.fetch(num, query)
+            if rv != 'OK':
+                raise RuntimeError('Failed to fetch message {}'
+                                   .format(num))
+
+            seen_rv, seen_data = conn.store(num, '+FLAGS', '\\Seen')
+
+            yield result
+
+    def GetEmailParts(self, search_filter='UNSEEN', allow=None,
+                      subtypes=('plain', 'html'), max_part_size=65536,
+                      n=None, batch_size=100, mark_skipped=True):
+        """
+        Yield the headers and text parts of the emails matching
+        search_filter, without downloading attachments.
 
-                yield result
+        Emails are read header-first: ENVELOPE and BODYSTRUCTURE are fetched
+        for a batch of emails, emails not matching allow are skipped, and
+        only the text parts of the others are fetched with
+        BODY.PEEK[section]<0.max_part_size>, one command per batch and
+        layout of parts. Emails are marked as seen after they have been
+        yielded, so those left when the consumer stops early stay unseen.
+
+        Parameters
+        ----------
+        search_filter : str, default 'UNSEEN'
+            IMAP search criteria.
+        allow : AllowList, default None
+            Emails to fetch, if None every email is fetched.
+        subtypes : tuple, default ('plain', 'html')
+            Subtypes of the text parts to fetch.
+        max_part_size : int, default 65536
+            Maximum number of bytes fetched per part.
+        n : int, default None
+            Maximum number of emails looked at, if None all matching emails.
+        batch_size : int, default 100
+            Number of emails per command.
+        mark_skipped : bool, default True
+            If True emails skipped by allow are marked as seen too, so they
+            are not looked at again.
+
+        Yields
+        ------
+        email : dict
+            uid, date, subject, from, to and message_id of the email, its
+            parts as a dict mapping subtype to decoded text, and whether any
+            part was truncated.
+        """
+        conn = None
+        try:
+            conn = self.connect()
+            for email in self.FetchEmailParts(
+                    conn, search_filter, allow, subtypes, max_part_size, n,
+                    batch_size, mark_skipped):
+                yield email
         finally:
-            conn.close()
-            conn.logout()
+            if conn is not None:
+                conn.close()
+                conn.logout()
+
+    def FetchEmailParts(self, conn, search_filter='UNSEEN', allow=None,
+                        subtypes=('plain', 'html'), max_part_size=65536,
+                        n=None, batch_size=100, mark_skipped=True):
+        """
+        Same as GetEmailParts(), on an open connection returned by
+        connect().
+        """
+        rv, data = conn.uid('SEARCH', None, search_filter)
+        if rv != 'OK':
+            logging.info('No messages found in {}'.format(self.mailbox))
+            return
+        labels = data[0].split()
+        n = len(labels) if n is None else min(n, len(labels))
+
+        for i in range(0, n, batch_size):
+            uids = message_set(labels[i:min(i + batch_size, n)])
+            rv, result = conn.uid('FETCH', uids, '(ENVELOPE BODYSTRUCTURE)')
+            if rv != 'OK':
+                raise RuntimeError('Failed to fetch messages {}'.format(uids))
+
+            emails = []
+            skipped = []
+            for response in split_fetch_response(result):
+                items = parse_fetch(response)
+                email = parse_envelope(items['ENVELOPE'])
+                email['uid'] = items['UID']
+                if allow is not None and not allow.matches(email):
+                    logging.debug('Skipping email {} from {}'.format(
+                        email['uid'], email['from']))
+                    skipped.append(email['uid'])
+                    continue
+                emails.append((email, text_parts(items['BODYSTRUCTURE'],
+                                                 subtypes)))
+
+            #  fetch the parts of emails with the same layout together
+            layouts = OrderedDict()
+            for email, parts in emails:
+                sections = tuple(p['section'] for p in parts)
+                if sections:
+                    layouts.setdefault(sections, []).append(email['uid'])
+            bodies = dict()
+            for sections, layout_uids in layouts.items():
+                query = '({})'.format(' '.join(
+                    'BODY.PEEK[{}]<0.{}>'.format(s, max_part_size)
+                    for s in sections))
+                rv, result = conn.uid('FETCH', message_set(layout_uids),
+                                      query)
+                if rv != 'OK':
+                    raise RuntimeError('Failed to fetch parts of messages {}'
+                                       .format(layout_uids))
+                for response in split_fetch_response(result):
+                    items = parse_fetch(response)
+                    bodies[items['UID']] = items
+
+            #  only mark the emails handed out (and the skipped ones), so
+            #  those left unread when the consumer stops are fetched again
+            seen = list(skipped) if mark_skipped else []
+            try:
+                for email, parts in emails:
+                    items = bodies.get(email['uid'], {})
+                    email['parts'] = dict()
+                    email['truncated'] = False
+                    for part in parts:
+                        data = items.get(
+                            'BODY[{}]<0>'.format(part['section']),
+                            items.get('BODY[{}]'.format(part['section'])))
+                        if data is None:
+                            continue
+                        email['parts'][part['subtype']] = decode_part(
+                            data, part['encoding'], part['charset'])
+                        email['truncated'] |= part['size'] > max_part_size
+                    seen.append(email['uid'])
+                    yield email
+            finally:
+                if seen:
+                    conn.uid('STORE', message_set(seen), '+FLAGS.SILENT',
+                             '(\\Seen)')
+
+
+class EmailListener(object):
+    """
+    Keep one authenticated session open and hand new emails to a callback or
+    queue as they arrive.
+
+    New messages are pushed by the server with IMAP IDLE; if the server does
+    not support IDLE the mailbox is polled with NOOP every poll_interval
+    seconds. A dropped connection, failed login or failed fetch reopens the
+    session, waiting up to max_backoff seconds between attempts. An exception
+    raised by callback is logged and the next message is handled.
+
+    Parameters
+    ----------
+    parser : EmailParser
+        Account and mailbox to listen to.
+    callback : callable, default None
+        Called with the FETCH data of every new message.
+    queue : queue.Queue, default None
+        Queue the FETCH data of every new message is put in, if no callback
+        is given.
+    search_filter, query, batch_size
+        Passed to EmailParser.FetchEmails().
+    fetch : callable, default None
+        Called with the open connection to fetch new emails instead of
+        EmailParser.FetchEmails(), e.g. to use FetchEmailParts().
+    idle_timeout : float, default 29 minutes
+        Seconds after which IDLE is restarted, as servers may drop idle
+        connections after 30 minutes.
+    poll_interval : float, default 30
+        Seconds between NOOPs if the server does not support IDLE.
+    max_backoff : float, default 300
+        Longest wait in seconds before reconnecting.
+    """
+    def __init__(self, parser, callback=None, queue=None,
+                 search_filter='UNSEEN', query='(RFC822)', batch_size=100,
+                 fetch=None, idle_timeout=29 * 60, poll_interval=30,
+                 max_backoff=300):
+        if callback is None and queue is None:
+            raise ValueError('Either callback or queue must be given')
+        self.parser = parser
+        self.callback = callback if callback is not None else queue.put
+        self.search_filter = search_filter
+        self.query = query
+        self.batch_size = batch_size
+        self.fetch = fetch
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Listen from a background thread.
+        """
+        self._stop.clear()
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop listening and wait for the background thread to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        """
+        Listen until stop() is called, reconnecting on connection errors.
+        """
+        backoff = 1
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self.parser.connect()
+                logging.info('Listening to {} on {}'.format(
+                    self.parser.mailbox, self.parser.host))
+                backoff = 1
+                self._listen(conn)
+            except (imaplib.IMAP4.error, RuntimeError, OSError) as e:
+                #  IMAP4.error covers failed logins and IDLE exchanges as
+                #  well as aborted connections, RuntimeError failed FETCHes
+                logging.warning('Session on {} failed ({}), reconnecting in '
+                                '{} s'.format(self.parser.host, e, backoff))
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.logout()
+                    except (imaplib.IMAP4.error, OSError):
+                        pass
+
+    def _listen(self, conn):
+        use_idle = 'IDLE' in conn.capabilities
+        while not self._stop.is_set():
+            if self.fetch is not None:
+                messages = self.fetch(conn)
+            else:
+                messages = self.parser.FetchEmails(
+                    conn, self.search_filter, self.query,
+                    batch_size=self.batch_size)
+            for message in messages:
+                try:
+                    self.callback(message)
+                except Exception:
+                    logging.exception('Callback failed on a message of {} '
+                                      '({})'.format(self.parser.mailbox,
+                                                    self.parser.host))
+            if use_idle:
+                idle(conn, self.idle_timeout, self._stop)
+            elif not self._stop.wait(self.poll_interval):
+                conn.noop()
 
 
 if __name__ == '__main__':
-    p = EmailParser('imap.gmail.com', 'inbox', 'USERNAME', 'PASSWORD')
-    for msg in p.GetEmails():
-        print(msg)
+    parser = argparse.ArgumentParser(description='Print unseen emails.')
+    parser.add_argument('--host', default='imap.gmail.com')
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--no-ssl', dest='ssl', action='store_false')
+    parser.add_argument('--mailbox', default='inbox')
+    parser.add_argument('--user', default='USERNAME')
+    parser.add_argument('--password', default='PASSWORD')
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--listen', action='store_true',
+                        help='keep listening for new emails')
+    args = parser.parse_args()
+
+    p = EmailParser(args.host, args.mailbox, args.user, args.password,
+                    port=args.port, ssl=args.ssl)
+    if args.listen:
+        logging.basicConfig(level=logging.INFO)
+        EmailListener(p, callback=print,
+                      batch_size=args.batch_size or 100).run()
+    else:
+        for msg in p.GetEmails(batch_size=args.batch_size):
+            print(msg)
@@ -1,19 +1,337 @@
 """Module to scrape data from email and dump in a text file.
+
+Emails are normalized into records (message-id, sender, date, subject, text)
+and appended to a MailLog: rotating, gzip compressed JSON-lines files in
+`mail_data/`, written append-only and deduplicated by Message-ID.
 """
+from email import message_from_bytes, message_from_string
+from email.header import decode_header, make_header
+from email.message import Message
+from email.utils import parseaddr, parsedate_to_datetime
+from html.parser import HTMLParser
+import atexit
+import datetime
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import zlib
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAIL_DATA = os.path.join(HERE, 'mail_data')
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the text of an HTML document, skipping scripts and styles.
+    """
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self._skip += 1
+        elif tag in ('br', 'p', 'div', 'li', 'tr', 'h1', 'h2', 'h3'):
+            self.chunks.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style') and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.chunks.append(data)
+
+
+def html_to_text(html):
+    """Return the text of an HTML document.
+    """
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return ''.join(extractor.chunks)
+
+
+def _normalize_text(text):
+    lines = (' '.join(line.split()) for line in text.splitlines())
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+def _header(value):
+    if value is None:
+        return None
+    try:
+        return str(make_header(decode_header(str(value))))
+    except (ValueError, LookupError):
+        return str(value)
+
+
+def _date(value):
+    """Return an email date as an ISO 8601 string in UTC, or None.
+    """
+    if not value:
+        return None
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return date.astimezone(datetime.timezone.utc).isoformat()
+
+
+def _message(email):
+    """Return email (FETCH data, RFC822 bytes or text) as an email Message.
+    """
+    if isinstance(email, Message):
+        return email
+    if isinstance(email, str):
+        return message_from_string(email)
+    if isinstance(email, (bytes, bytearray)):
+        return message_from_bytes(bytes(email))
+    for item in email:
+        if isinstance(item, tuple):
+            return message_from_bytes(item[1])
+    raise ValueError('No message body in FETCH data')
+
+
+def _body_text(message):
+    """Return the text/plain part of message, or the text of its text/html
+    part.
+    """
+    texts = dict()
+    for part in message.walk():
+        if part.get_content_maintype() != 'text' or \
+                part.get_filename() is not None:
+            continue
+        subtype = part.get_content_subtype()
+        if subtype not in ('plain', 'html') or subtype in texts:
+            continue
+        payload = part.get_payload(decode=True) or b''
+        charset = part.get_content_charset() or 'utf-8'
+        try:
+            texts[subtype] = payload.decode(charset, 'replace')
+        except LookupError:
+            texts[subtype] = payload.decode('utf-8', 'replace')
+    if 'plain' in texts:
+        return texts['plain']
+    return html_to_text(texts.get('html', ''))
+
 
 def email_scraper(email):
     """This method should consider different types of emails.
+
+    Normalize email into a record with message_id, sender, date (ISO 8601,
+    UTC), subject and text. email may be the FETCH data yielded by
+    EmailParser.GetEmails(), RFC822 bytes or text, an email Message, a dict
+    yielded by EmailParser.GetEmailParts(), or a driver.Email holding any of
+    these (whose account and mailbox are added to the record).
+    """
+    extra = dict()
+    if hasattr(email, 'account') and hasattr(email, 'message'):
+        extra = {'account': email.account, 'mailbox': email.mailbox}
+        email = email.message
+
+    if isinstance(email, dict):
+        parts = email.get('parts', {})
+        text = parts.get('plain')
+        if text is None:
+            text = html_to_text(parts.get('html', ''))
+        record = {'message_id': email.get('message_id'),
+                  'sender': email.get('from'),
+                  'date': _date(email.get('date')),
+                  'subject': email.get('subject')}
+    else:
+        message = _message(email)
+        text = _body_text(message)
+        record = {'message_id': _header(message['Message-ID']),
+                  'sender': parseaddr(_header(message['From']) or '')[1] or
+                  None,
+                  'date': _date(message['Date']),
+                  'subject': _header(message['Subject'])}
+    if record['sender']:
+        record['sender'] = record['sender'].lower()
+    record['text'] = _normalize_text(text)
+    if not record['message_id']:
+        key = '\x1f'.join(str(record[k]) for k in
+                          ('sender', 'date', 'subject', 'text'))
+        record['message_id'] = '<{}@generated>'.format(
+            hashlib.sha1(key.encode('utf-8')).hexdigest())
+    record['message_id'] = record['message_id'].strip()
+    record.update(extra)
+    return record
+
+
+class MailLog(object):
+    """Append-only log of email records.
+
+    Records are written as JSON lines to gzip compressed files named
+    `emails_<timestamp>.jsonl.gz` in directory. A new file is started once
+    the current one holds max_bytes of uncompressed records. Records whose
+    Message-ID was already logged, in this or an earlier run, are dropped.
+
+    Writes are flushed and fsynced once every sync_every records or
+    sync_interval seconds, whichever comes first, and on close(); a crash
+    loses at most the records since the last sync.
+
+    Parameters
+    ----------
+    directory : str, default MAIL_DATA
+        Directory of the log files, created if missing.
+    max_bytes : int, default 64 MB
+        Uncompressed size at which a new file is started.
+    sync_every : int, default 500
+        Number of records between syncs.
+    sync_interval : float, default 5.0
+        Seconds between syncs.
     """
-    pass
+    def __init__(self, directory=MAIL_DATA, max_bytes=64 * 1024 ** 2,
+                 sync_every=500, sync_interval=5.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        os.makedirs(directory, exist_ok=True)
+        self.message_ids = set(
+            record['message_id'] for record in self.read(directory))
+        self._file = None
+        self._size = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.message_ids)
+
+    @staticmethod
+    def files(directory=MAIL_DATA):
+        """Return the log files in directory, oldest first.
+        """
+        return sorted(glob.glob(os.path.join(directory,
+                                             'emails_*.jsonl.gz')))
+
+    @classmethod
+    def read(cls, directory=MAIL_DATA):
+        """Yield every record logged in directory, oldest first.
+
+        A file cut short by a crash is read up to its last complete record.
+        """
+        for fname in cls.files(directory):
+            try:
+                with gzip.open(fname, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            logging.warning('Skipping corrupt record in '
+                                            '{}'.format(fname))
+            except (EOFError, OSError) as e:
+                logging.warning('Stopped reading {}: {}'.format(fname, e))
+
+    def _open(self):
+        timestamp = time.strftime('%Y%m%dT%H%M%S')
+        fname = os.path.join(self.directory,
+                             'emails_{}.jsonl.gz'.format(timestamp))
+        n = 1
+        while os.path.exists(fname):
+            fname = os.path.join(self.directory, 'emails_{}_{}.jsonl.gz'
+                                 .format(timestamp, n))
+            n += 1
+        logging.info('Logging emails to {}'.format(fname))
+        self._file = gzip.open(fname, 'ab')
+        self._size = 0
+
+    def append(self, record):
+        """Log record unless its Message-ID was logged before.
 
-def save_data(raw_data):
-    """For now we will save everything in a text file.
+        Returns
+        -------
+        appended : bool
+            False if record is a duplicate.
+        """
+        if record['message_id'] in self.message_ids:
+            return False
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        if self._file is None or self._size + len(line) > self.max_bytes:
+            if self._file is not None:
+                self._close_file()
+            self._open()
+        self._file.write(line)
+        self._size += len(line)
+        self.message_ids.add(record['message_id'])
+        self._pending += 1
+        if self._pending >= self.sync_every or \
+                time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+        return True
+
+    def extend(self, records):
+        """Log every record, returning the number of records appended.
+        """
+        return sum(self.append(record) for record in records)
+
+    def sync(self):
+        """Flush and fsync the records written so far.
+        """
+        if self._file is not None and self._pending:
+            self._file.flush(zlib.Z_SYNC_FLUSH)
+            os.fsync(self._file.fileobj.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _close_file(self):
+        self.sync()
+        self._file.close()
+        self._file = None
+
+    def close(self):
+        if self._file is not None:
+            self._close_file()
+
+
+#  sink used by save_data() and scrape() unless one is given
+_mail_log = None
+
+
+def _default_log():
+    global _mail_log
+    if _mail_log is None:
+        _mail_log = MailLog()
+        atexit.register(_mail_log.close)
+    return _mail_log
+
+
+def save_data(raw_data, sink=None):
+    """Append a record (or a list of records) to sink, the MailLog in
+    `mail_data/` by default.
     """
-    with open('raw_data.txt', 'w') as file:
-        file.write(raw_data)
+    sink = _default_log() if sink is None else sink
+    if isinstance(raw_data, dict):
+        return sink.append(raw_data)
+    return sink.extend(raw_data)
+
 
-def scrape(email):
+def scrape(email, sink=None):
     """Scrape email contents and write to file.
     """
     raw_data = email_scraper(email)
-    save_data(raw_data)
+    return save_data(raw_data, sink)
+
+
+def scrape_all(emails, sink=None):
+    """Scrape every email of a stream, e.g. EmailParser.GetEmails() or an
+    IngestionDriver, returning the number of new records logged.
+    """
+    sink = _default_log() if sink is None else sink
+    return sink.extend(email_scraper(email) for email in emails)
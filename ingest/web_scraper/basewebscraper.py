@@ -1,5 +1,7 @@
 from abc import ABCMeta, abstractmethod
 import logging
+import threading
+import urllib.error
 
 
 class BaseWebScraper(metaclass=ABCMeta):
@@ -9,6 +11,46 @@ class BaseWebScraper(metaclass=ABCMeta):
     """
     _name = 'abstract'
     _root_url = ''
+    #  concurrency and per-host politeness limits used by scrape()
+    _max_workers = 4
+    _rate_limit = 1.0
+    _burst = 1
+    #  HTTP timeout (seconds) and retries used by the shared session
+    _timeout = 30
+    _retries = 3
+    #  on-disk HTTP cache, disabled unless a cache_dir is given
+    _cache_dir = None
+    _cache_size = 256 * 1024 ** 2
+    _session = None
+    _session_lock = threading.Lock()
+    #  number of processes parsing event pages in scrape(), 0 parses in the
+    #  main process
+    _parse_workers = 0
+    #  tree builder used for soups, falls back to 'html.parser' if missing
+    _parser = 'lxml'
+    #  SoupStrainer name (or dict of SoupStrainer arguments) restricting event
+    #  pages to the subtrees extract_details() reads; None parses everything
+    _parse_only = None
+    #  URLs already captured, set by scrape(known=...) without max_age;
+    #  get_event_urls() may use them to stop paginating once it reaches
+    #  previously seen events
+    _known_urls = frozenset()
+
+    def __init__(self, cache_dir=None, cache_size=None):
+        """
+        Parameters
+        ----------
+        cache_dir : string, default None
+            Directory of the on-disk HTTP cache used for conditional GETs,
+            if None responses are not cached.
+        cache_size : int, default None
+            Maximum size of the cache in bytes, if None `_cache_size` is used.
+        """
+        if cache_dir is not None:
+            self._cache_dir = cache_dir
+        if cache_size is not None:
+            self._cache_size = cache_size
+        self._session_lock = threading.Lock()
 
     @abstractmethod
     def extract_details(self, soup):
@@ -36,49 +78,351 @@ class BaseWebScraper(metaclass=ABCMeta):
         """
         raise NotImplemented
 
-    def scrape(self):
+    def scrape(self, max_workers=None, rate=None, burst=None, refresh=False,
+               known=None, max_age=None, parse_workers=None):
         """
         Scrape website for info on all events.
         Details are extracted into a DataFrame object.
 
+        Event pages are fetched by a pool of threads, keeping up to
+        max_workers requests in flight, while a per-host token bucket limits
+        how often each host is hit. If the scraper has an HTTP cache, pages
+        that were not modified since the last run are neither downloaded nor
+        parsed again.
+
+        With parse_workers, fetched pages are handed to a pool of processes
+        that parse them and run extract_details(), so parsing uses several
+        cores and never holds up the fetching threads.
+
+        Parameters
+        ----------
+        max_workers : int, default None
+            Number of concurrent requests, at least 1, if None
+            `_max_workers` is used. Workers only help across hosts or with a
+            higher rate: the default `_rate_limit` of 1.0 and `_burst` of 1
+            cap a scraper reading a single host at one request per second,
+            however many workers it has.
+        rate : float, default None
+            Requests per second allowed per host, if None `_rate_limit` is
+            used.
+        burst : int, default None
+            Requests a host may receive back-to-back, if None `_burst` is
+            used.
+        refresh : bool, default False
+            If True every page is downloaded and parsed, ignoring the cache.
+        known : DataFrame, dict or list-like, default None
+            Events already captured, for incremental scraping. Either a
+            DataFrame with URL and LAST_UPDATED columns (e.g. the output of
+            combine_csv_files()), a dict mapping URL to LAST_UPDATED, or a
+            collection of URLs. Known URLs are skipped unless they are older
+            than max_age. If None every event is scraped. Without max_age,
+            scrapers may also stop listing events once they reach known ones.
+        max_age : str or pandas.Timedelta, default None
+            Known events last updated longer than max_age ago (e.g. '7D') are
+            scraped again. If None known events are never scraped again.
+        parse_workers : int, default None
+            Number of parser processes, if None `_parse_workers` is used. If
+            0 pages are parsed in the main process.
+
         Returns
         -------
         event_df : pandas.core.frame.DataFrame
             DataFrame object containing info for all events scraped.
         """
-        import urllib.request
+        from concurrent.futures import ProcessPoolExecutor, wait
+        from concurrent.futures.process import BrokenProcessPool
         from tqdm import tqdm
-        import random
-        import time
         import pandas as pd
+        from events import EventRecords
 
-        event_urls = self.get_event_urls()
-        df = pd.DataFrame()
+        max_workers = self._check_max_workers(max_workers)
+        if known is not None:
+            known = self._known_timestamps(known)
+            #  stopping at known events would miss stale ones to re-fetch
+            if max_age is None:
+                self._known_urls = frozenset(known)
+        try:
+            event_urls = self.get_event_urls()
+        finally:
+            self._known_urls = frozenset()
+        if known is not None:
+            event_urls = self.select_urls(event_urls, known, max_age)
+        records = EventRecords()
+        cache = self.session.cache
 
-        for url in tqdm(event_urls, desc='Parsing Events'):
-            logging.debug('Reading webpage at url {}'.format(url))
-            try:
-                time.sleep(random.uniform(1, 3))
-                soup = self.get_soup(url)
-            except (urllib.error.HTTPError, urllib.error.URLError):
-                error_msg = '\nHTTPError: Failure to read {}\n'.format(url)
-                logging.error(error_msg)
-                continue
-            except KeyboardInterrupt:
-                msg = 'KeyboardInterrupt received. Skipping remaining events.'
-                logging.warning(msg)
-                return df
-
-            #  get details
-            details = self.extract_details(soup)
+        def add_details(url, details):
             details['URL'] = url
             details['LAST_UPDATED'] = pd.Timestamp('now')
             # TODO Add timezone to LAST_UPDATED ('now', tz='US/Pacific')
-            df = df.append(details, ignore_index=True)
+            records.append(details)
+
+        def collect(future):
+            url, response_url = parsing.pop(future)
+            try:
+                details = future.result()
+            except Exception as e:
+                logging.error('Failure to extract details from {}: {!r}'
+                              .format(url, e))
+                return
+            if cache is not None:
+                cache.put_details(response_url, dict(details))
+            add_details(url, details)
+
+        if parse_workers is None:
+            parse_workers = self._parse_workers
+        pool = None
+        if parse_workers:
+            pool = ProcessPoolExecutor(max_workers=parse_workers,
+                                       initializer=_init_parse_worker,
+                                       initargs=(type(self), self._parser))
+        parsing = dict()
+
+        pages = self.iter_pages(event_urls,
+                                max_workers=max_workers,
+                                rate=rate,
+                                burst=burst,
+                                refresh=refresh)
+        try:
+            for url, response in tqdm(pages, total=len(event_urls),
+                                      desc='Parsing Events'):
+                if response is None:
+                    continue
+                #  get details
+                details = None
+                if response.not_modified:
+                    details = cache.get_details(response.url)
+                if details is not None:
+                    add_details(url, details)
+                    continue
+                if pool is not None:
+                    try:
+                        future = pool.submit(_parse_worker, response.content)
+                        parsing[future] = (url, response.url)
+                        for future in [f for f in parsing if f.done()]:
+                            collect(future)
+                        continue
+                    except BrokenProcessPool:
+                        logging.error('Parser processes died, parsing '
+                                      'remaining pages in main process')
+                        pool = None
+                try:
+                    details = self.extract_details(
+                        self.make_soup(response.content,
+                                       self.event_strainer()))
+                except Exception as e:
+                    logging.error('Failure to extract details from {}: {!r}'
+                                  .format(url, e))
+                    continue
+                if cache is not None:
+                    cache.put_details(response.url, dict(details))
+                add_details(url, details)
+            wait(parsing)
+            for future in list(parsing):
+                collect(future)
+        except KeyboardInterrupt:
+            msg = 'KeyboardInterrupt received. Skipping remaining events.'
+            logging.warning(msg)
+        finally:
+            pages.close()
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        return records.to_frame()
+
+    def select_urls(self, event_urls, known, max_age=None):
+        """
+        Return the event_urls that are new or whose known version is stale.
+
+        Parameters
+        ----------
+        event_urls : list-like iterable
+            URLs of event-pages, as returned by get_event_urls().
+        known : DataFrame, dict or list-like
+            Events already captured, see scrape().
+        max_age : str or pandas.Timedelta, default None
+            Age after which a known event is considered stale, if None known
+            events are never stale.
+
+        Returns
+        -------
+        urls : list
+            URLs that should be scraped.
+        """
+        import pandas as pd
 
-        return df
+        known = self._known_timestamps(known)
+        cutoff = None
+        if max_age is not None:
+            cutoff = pd.Timestamp('now') - pd.Timedelta(max_age)
 
-    def save_csv(self, events_df, filename=None):
+        urls = []
+        num_new = num_stale = 0
+        for url in event_urls:
+            if url not in known:
+                num_new += 1
+            elif cutoff is not None and not (pd.Timestamp(known[url])
+                                             >= cutoff):
+                num_stale += 1
+            else:
+                continue
+            urls.append(url)
+
+        logging.info('Found {} new and {} stale events, skipping {} '
+                     'up-to-date events'.format(num_new, num_stale,
+                                                len(event_urls) - len(urls)))
+        return urls
+
+    @staticmethod
+    def _known_timestamps(known):
+        """
+        Return known events as a dict mapping URL to LAST_UPDATED.
+        """
+        import pandas as pd
+        if isinstance(known, pd.DataFrame):
+            last_updated = pd.to_datetime(known['LAST_UPDATED'],
+                                          errors='coerce')
+            return last_updated.groupby(known['URL']).max().to_dict()
+        if isinstance(known, pd.Series):
+            return known.to_dict()
+        if isinstance(known, dict):
+            return known
+        return dict.fromkeys(known)
+
+    def _check_max_workers(self, max_workers):
+        """
+        Return max_workers, or `_max_workers` if None, raising ValueError if
+        it is not a positive number of workers.
+        """
+        max_workers = self._max_workers if max_workers is None else max_workers
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1, got {}'
+                             .format(max_workers))
+        return max_workers
+
+    def iter_pages(self, urls, max_workers=None, rate=None, burst=None,
+                   refresh=False):
+        """
+        Fetch urls concurrently and yield their responses as they complete.
+
+        Requests are dispatched round-robin across hosts, and a host is only
+        sent a request when its token bucket allows it and it holds fewer
+        than its share of the workers (max_workers divided by the number of
+        hosts with URLs left, rounded up), so one slow or failing host does
+        not hold back the others. Pages that fail to load are logged and
+        yielded with a response of None.
+
+        Parameters
+        ----------
+        urls : list-like iterable
+            URLs to fetch.
+        max_workers : int, default None
+            Number of concurrent requests, at least 1, if None
+            `_max_workers` is used. Workers only help across hosts or with a
+            higher rate: the default `_rate_limit` of 1.0 and `_burst` of 1
+            cap a scraper reading a single host at one request per second,
+            however many workers it has.
+        rate : float, default None
+            Requests per second allowed per host, if None `_rate_limit` is
+            used.
+        burst : int, default None
+            Requests a host may receive back-to-back, if None `_burst` is
+            used.
+        refresh : bool, default False
+            If True the cache is bypassed.
+
+        Yields
+        ------
+        url, response : tuple
+            URL of the page and its session.Response (None on failure), in
+            order of completion.
+        """
+        from collections import Counter, OrderedDict, deque
+        from concurrent.futures import (ThreadPoolExecutor, wait,
+                                        FIRST_COMPLETED)
+        import math
+        import time
+        from ratelimit import HostRateLimiter
+
+        max_workers = self._check_max_workers(max_workers)
+        limiter = HostRateLimiter(self._rate_limit if rate is None else rate,
+                                  self._burst if burst is None else burst)
+
+        queues = OrderedDict()
+        for url in urls:
+            queues.setdefault(limiter.host(url), deque()).append(url)
+
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        pending = dict()
+        #  requests in flight per host
+        in_flight = Counter()
+        try:
+            while queues or pending:
+                #  dispatch one request per ready host until the pool is full
+                host_cap = math.ceil(max_workers / max(1, len(queues)))
+                for host in list(queues):
+                    if len(pending) >= max_workers:
+                        break
+                    if in_flight[host] >= host_cap:
+                        continue
+                    if not limiter.try_acquire(host):
+                        continue
+                    url = queues[host].popleft()
+                    if not queues[host]:
+                        del queues[host]
+                    logging.debug('Reading webpage at url {}'.format(url))
+                    future = pool.submit(self.get_page, url, refresh)
+                    pending[future] = url, host
+                    in_flight[host] += 1
+
+                timeout = None
+                ready = [h for h in queues if in_flight[h] < host_cap]
+                if ready and len(pending) < max_workers:
+                    timeout = limiter.wait_time(ready)
+                if not pending:
+                    time.sleep(timeout)
+                    continue
+
+                done, _ = wait(pending, timeout=timeout,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, host = pending.pop(future)
+                    in_flight[host] -= 1
+                    try:
+                        yield url, future.result()
+                    except (urllib.error.HTTPError, urllib.error.URLError):
+                        error_msg = '\nHTTPError: Failure to read {}\n'
+                        logging.error(error_msg.format(url))
+                        yield url, None
+                    except Exception as e:
+                        logging.error('Failure to read {}: {!r}'.format(
+                            url, e))
+                        yield url, None
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def iter_soups(self, urls, **kwargs):
+        """
+        Fetch urls concurrently and yield their soups as they complete.
+        Takes the same keyword arguments as iter_pages().
+
+        Yields
+        ------
+        url, soup : tuple
+            URL of the page and its soup (None on failure), in order of
+            completion.
+        """
+        pages = self.iter_pages(urls, **kwargs)
+        try:
+            for url, response in pages:
+                if response is None:
+                    yield url, None
+                else:
+                    yield url, self.make_soup(response.content)
+        finally:
+            pages.close()
+
+    def save_csv(self, events_df, filename=None, store=None, delta=False,
+                 removals=True):
         """
         Save events_df into a CSV file.
 
@@ -88,12 +432,40 @@ class BaseWebScraper(metaclass=ABCMeta):
             DataFrame containing info.
         filename : string, default None
             File path, if None is provided the result is returned as a string.
+        store : EventStore or string, default None
+            Event store (or path of one) to upsert events_df into instead of
+            writing a CSV file. Nothing is returned in that case.
+        delta : bool, default False
+            If True only the events added, changed or removed since the
+            previous snapshots in 'scraped_data/' are saved, into a
+            `<name>_delta_<timestamp>.csv` file with a CHANGE column (see
+            snapshots.diff_events()). If there is no full snapshot to compare
+            with, a full snapshot is saved instead.
+        removals : bool, default True
+            If False, events missing from events_df are not recorded as
+            removed in a delta, e.g. when events_df comes from an incremental
+            scrape.
         """
         import time
+        if store is not None:
+            with self._open_store(store) as _store:
+                _store.upsert(events_df)
+            return
+        kind = 'events'
+        if delta:
+            from snapshots import diff_events, snapshot_at
+            previous_df = snapshot_at(self._name, directory='scraped_data')
+            if previous_df is None:
+                logging.info('No previous snapshot of {}, saving a full '
+                             'snapshot'.format(self._name))
+            else:
+                events_df = diff_events(previous_df, events_df,
+                                        removals=removals)
+                kind = 'delta'
         if filename is None:
             timestamp = time.strftime('%Y%m%dT%H%M%S')
-            _filename = 'scraped_data/{}_events_{}.csv'.format(
-                self._name, timestamp)
+            _filename = 'scraped_data/{}_{}_{}.csv'.format(
+                self._name, kind, timestamp)
         else:
             _filename = filename
 
@@ -103,91 +475,212 @@ class BaseWebScraper(metaclass=ABCMeta):
         if filename is None:
             return _filename
 
-    def get_soup(self, url):
+    @property
+    def session(self):
+        """
+        HTTPSession shared by all requests of this scraper.
+
+        Connections are pooled per host, so pages on the same site reuse the
+        same keep-alive connections. If the scraper was created with a
+        cache_dir, responses are cached there and revalidated with
+        conditional GETs.
+        """
+        from session import HTTPSession
+        from httpcache import HTTPCache
+        with self._session_lock:
+            if self._session is None:
+                cache = None
+                if self._cache_dir is not None:
+                    cache = HTTPCache(self._cache_dir,
+                                      max_bytes=self._cache_size)
+                self._session = HTTPSession(timeout=self._timeout,
+                                            retries=self._retries,
+                                            pool_size=self._max_workers,
+                                            cache=cache)
+            return self._session
+
+    def get_page(self, url, refresh=False):
+        """
+        Return session.Response of webpage at url.
+
+        Parameters
+        ----------
+        url : str
+            URL of the webpage.
+        refresh : bool, default False
+            If True the cache is bypassed.
+        """
+        return self.session.get(url, refresh=refresh)
+
+    def make_soup(self, data, parse_only=None):
+        """
+        Return soup of webpage contents data.
+
+        Parameters
+        ----------
+        data : bytes or str
+            HTML of the webpage.
+        parse_only : SoupStrainer, default None
+            If given only the matching parts of the page are parsed.
+        """
+        from bs4 import BeautifulSoup, FeatureNotFound
+        try:
+            return BeautifulSoup(data, self._parser, parse_only=parse_only)
+        except FeatureNotFound:
+            logging.warning('Parser {} is not installed, falling back to '
+                            'html.parser'.format(self._parser))
+            self._parser = 'html.parser'
+            return BeautifulSoup(data, self._parser, parse_only=parse_only)
+
+    def event_strainer(self):
+        """
+        Return SoupStrainer for event pages built from `_parse_only`, or None
+        if event pages are parsed in full.
+        """
+        from bs4 import SoupStrainer
+        if self._parse_only is None:
+            return None
+        if isinstance(self._parse_only, dict):
+            return SoupStrainer(**self._parse_only)
+        return SoupStrainer(self._parse_only)
+
+    def save_parquet(self, events_df, filename=None):
+        """
+        Save events_df into a compressed Parquet file with typed list and
+        timestamp columns (see snapshots.py).
+
+        Parameters
+        ----------
+        events_df : DataFrame
+            DataFrame containing info.
+        filename : string, default None
+            File path, if None is provided the result is returned as a string.
+        """
+        import time
+        from snapshots import write_parquet
+        if filename is None:
+            timestamp = time.strftime('%Y%m%dT%H%M%S')
+            _filename = 'scraped_data/{}_events_{}.parquet'.format(
+                self._name, timestamp)
+        else:
+            _filename = filename
+
+        write_parquet(events_df, _filename)
+        logging.info('Saved events DataFrame to {}'.format(_filename))
+        if filename is None:
+            return _filename
+
+    def get_soup(self, url, refresh=False):
         """
         Return soup of webpage at url.
         """
-        import urllib.request
-        from bs4 import BeautifulSoup
-        #  header for request
-        hdr = {
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',  #NOQA
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',  #NOQA
-            'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
-            'Accept-Encoding': 'none',
-            'Accept-Language': 'en-US,en;q=0.8',
-            'Connection': 'keep-alive'}
-        #  assemble request
-        request = urllib.request.Request(url=url,
-                                         data=None,
-                                         headers=hdr)
-        response = urllib.request.urlopen(request)
-        #  get required data
-        data = response.read()
-        soup = BeautifulSoup(data, 'html.parser')
-        return soup
-
-    def combine_csv_files(self, csv_files=None):
-        """
-        Read CSV files and combine into single DataFrame object.
-        Keep only latest versions of each URL.
+        return self.make_soup(self.get_page(url, refresh).content)
+
+    @staticmethod
+    def _open_store(store):
+        """
+        Return a context manager yielding the EventStore store, opening it
+        (and closing it afterwards) if a path is given.
+        """
+        from contextlib import contextmanager, nullcontext
+        from eventstore import EventStore
+        if isinstance(store, EventStore):
+            return nullcontext(store)
+
+        @contextmanager
+        def opened():
+            with EventStore(store) as _store:
+                yield _store
+        return opened()
+
+    def combine_csv_files(self, csv_files=None, columns=None, store=None,
+                          output=None, chunksize=100000):
+        """
+        Read CSV (or Parquet) files and combine into single DataFrame object.
+        Keep only latest versions of each URL. Removals recorded in delta
+        snapshots are skipped, so removed events keep their last version.
+
+        Snapshots are normalized as they are read (see snapshots.py), so list
+        columns hold lists and LAST_UPDATED holds timestamps.
 
         Parameters
         ----------
         csv_files : list, default None
-            List of path of CSV files to read, if None is provided the CSV
-            files in 'scraped_data/' directory are read.
+            List of path of CSV or Parquet files to read, if None is provided
+            the files in 'scraped_data/' directory are read. A Parquet file
+            is read instead of a CSV file with the same name.
+        columns : list, default None
+            Columns to read, if None all columns are read. URL and
+            LAST_UPDATED are always read.
+        store : EventStore or string, default None
+            Event store (or path of one) holding the latest events, see
+            eventstore.py. If given the events are read from the store in a
+            single query and csv_files is ignored.
+        output : string, default None
+            If given the files are merged in chunks and the latest events are
+            written to this CSV (or .parquet) file instead of being returned,
+            so memory stays bounded however many files there are (see
+            snapshots.merge_snapshots()).
+        chunksize : int, default 100000
+            Number of rows read at a time when merging into output.
 
         Returns
         -------
         events_df : DataFrame
-            DataFrame object of events from all CSV files.
+            DataFrame object of events from all CSV files, or the number of
+            events written if output is given.
         """
         from os import walk
-        import numpy as np
+        from os.path import splitext
         import pandas as pd
+        from events import EVENT_COLUMNS, latest_per_url
+        from snapshots import event_rows, merge_snapshots, read_snapshot
 
         #  find files
         if csv_files is None:
-            _CSVs = []
+            fnames = []
             for dirpath, dirnames, fnames in walk('scraped_data'):
-                _CSVs.extend([dirpath + '/' + f for f in fnames
-                              if f.lower().endswith('.csv')])
                 break
+            parquets = set(splitext(f)[0] for f in fnames
+                           if f.lower().endswith('.parquet'))
+            _CSVs = []
+            for f in sorted(fnames):
+                stem, ext = splitext(f)
+                if (ext.lower() == '.parquet' or
+                        (ext.lower() == '.csv' and stem not in parquets)):
+                    _CSVs.append(dirpath + '/' + f)
         else:
             _CSVs = csv_files
 
+        if columns is not None:
+            columns = list(columns)
+            columns += [c for c in ('URL', 'LAST_UPDATED')
+                        if c not in columns]
+
+        if store is not None:
+            with self._open_store(store) as _store:
+                return _store.latest(columns=columns)
+
+        if output is not None:
+            return merge_snapshots(_CSVs, output, chunksize=chunksize,
+                                   columns=columns)
+
         #  read CSV files
         df_list = []
         for f in _CSVs:
-            logging.debug('Reading CSV file {}'.format(f))
-            df = pd.read_csv(f)
+            logging.debug('Reading snapshot {}'.format(f))
+            df = event_rows(read_snapshot(f, columns=columns))
             logging.debug('Shape = {}'.format(df.shape))
             df_list.append(df)
 
-        if len(df_list) > 1:
-            logging.debug('Combining into single DataFrame...')
-            events_df = (df_list[0]
-                         .append(df_list[1:],
-                                 ignore_index=True)
-                         .reset_index(drop=True))
-        else:
-            events_df = df_list[0]
+        if not df_list:
+            return pd.DataFrame(columns=list(columns or EVENT_COLUMNS))
+
+        logging.debug('Combining into single DataFrame...')
+        events_df = pd.concat(df_list, ignore_index=True)
 
         logging.debug('Finding duplicate events based on URL...')
-        is_latest = np.array([True] * events_df.shape[0])
-        for key, group in events_df.groupby('URL'):
-            if group.shape[0] > 1:
-                #  find latest timestamp and mark others for deletion
-                latest_ts = group.LAST_UPDATED.max()
-                is_latest[group[group.LAST_UPDATED < latest_ts].index] = False
-
-        logging.debug('Dropping {} duplicate events...'.format(
-            len(is_latest) - np.sum(is_latest)))
-        events_df = (events_df
-                     .loc[is_latest]
-                     .reset_index(drop=True)
-                     .copy(deep=True))
+        events_df = latest_per_url(events_df)
         return events_df
 
     def _test_extract_details(self, test_urls):
@@ -207,10 +700,29 @@ class BaseWebScraper(metaclass=ABCMeta):
         details_list = []
         for url in test_urls:
             print('test_extract_details(): url = {}'.format(url))
-            soup = self.get_soup(url)
+            soup = self.make_soup(self.get_page(url).content,
+                                  self.event_strainer())
             details = self.extract_details(soup)
             for k, v in details.items():
                 print('{: <10s} : {}'.format(k, v))
             print('-' * 80)
             details_list.append(details)
         return details_list
+
+
+#  scraper used by each parser process of scrape()
+_worker_scraper = None
+
+
+def _init_parse_worker(scraper_cls, parser):
+    global _worker_scraper
+    _worker_scraper = scraper_cls()
+    _worker_scraper._parser = parser
+
+
+def _parse_worker(data):
+    """
+    Parse page contents data and return the extracted details.
+    """
+    soup = _worker_scraper.make_soup(data, _worker_scraper.event_strainer())
+    return _worker_scraper.extract_details(soup)
@@ -0,0 +1,507 @@
+"""
+Benchmarks for the scraping pipeline.
+
+Typical Usage:
+    python benchmarks.py records
+    python benchmarks.py records --sizes 1000 5000 20000
+    python benchmarks.py save-fixtures fiveminutes risestronger -n 20
+    python benchmarks.py parse
+    python benchmarks.py extract risestronger
+    python benchmarks.py dedup --rows 1000000
+    python benchmarks.py merge --snapshots 10 20 40
+    python benchmarks.py datetimes
+"""
+import argparse
+import glob
+import hashlib
+import importlib
+import os
+import time
+import tracemalloc
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRAPED_DATA = os.path.join(HERE, 'scraped_data')
+FIXTURES = os.path.join(HERE, 'fixtures')
+
+#  scraper name -> (module, class) of scrapers that fetch event pages
+SCRAPERS = {'calltoactivism': ('calltoactivism', 'CallToActivismScraper'),
+            'dailygrabback': ('dailygrabback', 'DailyGrabBackScraper'),
+            'fiveminutes': ('fiveminutes', 'FiveMinutesScraper'),
+            'risestronger': ('risestronger', 'RiseStrongerScraper'),
+            'twohoursaweek': ('twohoursaweek', 'TwoHoursAWeekScraper')}
+
+
+def get_scraper(name):
+    """
+    Return a new instance of the scraper called name.
+    """
+    module, cls = SCRAPERS[name]
+    return getattr(importlib.import_module(module), cls)()
+
+
+def scraped_csv_files(directory=SCRAPED_DATA):
+    """
+    Return paths of the CSV snapshots in directory.
+    """
+    return sorted(glob.glob(os.path.join(directory, '*.csv')))
+
+
+def measure(func, *args, **kwargs):
+    """
+    Call func once and return (seconds, peak traced memory in bytes).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def load_records(csv_files=None):
+    """
+    Read the bundled CSV snapshots into a list of event dicts.
+    """
+    import pandas as pd
+    csv_files = scraped_csv_files() if csv_files is None else csv_files
+    records = []
+    for f in csv_files:
+        records.extend(pd.read_csv(f).to_dict('records'))
+    return records
+
+
+def bench_records(csv_files=None, sizes=(250, 500, 1000, 2000, 4000),
+                  legacy_limit=1000):
+    """
+    Compare building an events DataFrame row by row against EventRecords.
+
+    The row-by-row builder reproduces the old `df = df.append(details)` loop
+    with pd.concat, since DataFrame.append no longer exists.
+
+    Parameters
+    ----------
+    csv_files : list, default None
+        CSV files to take records from, if None the bundled snapshots are
+        used. Records are repeated if a size exceeds the number available.
+    sizes : list-like
+        Numbers of records to build frames from.
+    legacy_limit : int, default 1000
+        Sizes above this are only run with EventRecords.
+    """
+    import pandas as pd
+    from events import EventRecords
+
+    records = load_records(csv_files)
+    print('Loaded {} records'.format(len(records)))
+
+    def build_legacy(recs):
+        df = pd.DataFrame()
+        for details in recs:
+            df = pd.concat([df, pd.DataFrame([details])], ignore_index=True)
+        return df
+
+    def build_buffer(recs):
+        buf = EventRecords()
+        buf.extend(recs)
+        return buf.to_frame()
+
+    row = '{:>8} {:>12} {:>12} {:>12} {:>12}'
+    print(row.format('events', 'append [s]', 'append [MB]',
+                     'buffer [s]', 'buffer [MB]'))
+    for n in sizes:
+        recs = (records * (n // len(records) + 1))[:n]
+        if n <= legacy_limit:
+            t_old, m_old = measure(build_legacy, recs)
+            t_old, m_old = '{:.3f}'.format(t_old), '{:.1f}'.format(m_old / 1e6)
+        else:
+            t_old, m_old = '-', '-'
+        t_new, m_new = measure(build_buffer, recs)
+        print(row.format(n, t_old, m_old,
+                         '{:.3f}'.format(t_new), '{:.1f}'.format(m_new / 1e6)))
+
+
+def save_fixtures(names, n=20, directory=FIXTURES):
+    """
+    Download event pages and save them as HTML fixtures.
+
+    Pages are written to `<directory>/<scraper name>/<url hash>.html`.
+
+    Parameters
+    ----------
+    names : list
+        Names of the scrapers whose pages are saved.
+    n : int, default 20
+        Number of event pages saved per scraper.
+    directory : str, default FIXTURES
+        Root directory of the fixtures.
+    """
+    for name in names:
+        scraper = get_scraper(name)
+        urls = scraper.get_event_urls()[:n]
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+        for url, response in scraper.iter_pages(urls):
+            if response is None:
+                continue
+            key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+            path = os.path.join(directory, name, key + '.html')
+            with open(path, 'wb') as f:
+                f.write(response.content)
+        print('Saved {} pages of {}'.format(len(urls), name))
+
+
+def load_fixtures(name, directory=FIXTURES):
+    """
+    Return the saved HTML pages of scraper name as a list of bytes.
+    """
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, name, '*.html'))):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+
+def bench_parse(names=None, directory=FIXTURES, repeat=3,
+                parsers=('html.parser', 'lxml', 'html5lib')):
+    """
+    Time parsing of saved event pages with every installed parser, with and
+    without the scraper's SoupStrainer.
+
+    Parameters
+    ----------
+    names : list, default None
+        Names of the scrapers to benchmark, if None every scraper with
+        fixtures is used.
+    directory : str, default FIXTURES
+        Root directory of the fixtures, see save_fixtures().
+    repeat : int, default 3
+        Number of passes over the fixtures; the fastest pass is reported.
+    parsers : list-like
+        Parsers to try, those not installed are skipped.
+    """
+    from bs4 import BeautifulSoup, FeatureNotFound
+
+    available = []
+    for parser in parsers:
+        try:
+            BeautifulSoup('<p></p>', parser)
+            available.append(parser)
+        except FeatureNotFound:
+            print('Skipping {}: not installed'.format(parser))
+
+    names = sorted(SCRAPERS) if names is None else names
+    row = '{:<16} {:<12} {:<9} {:>6} {:>10}'
+    print(row.format('scraper', 'parser', 'strained', 'pages', 'ms/page'))
+    for name in names:
+        pages = load_fixtures(name, directory)
+        if not pages:
+            continue
+        scraper = get_scraper(name)
+        strainers = [None]
+        if scraper.event_strainer() is not None:
+            strainers.append(scraper.event_strainer())
+        for parser in available:
+            scraper._parser = parser
+            for strainer in strainers:
+                #  html5lib ignores parse_only
+                if strainer is not None and parser == 'html5lib':
+                    continue
+                best = float('inf')
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    for data in pages:
+                        scraper.make_soup(data, strainer)
+                    best = min(best, time.perf_counter() - start)
+                print(row.format(name, parser, str(strainer is not None),
+                                 len(pages),
+                                 '{:.2f}'.format(1e3 * best / len(pages))))
+
+
+class LegacyDateLine(object):
+    """
+    The previous date-line check of RiseStrongerScraper.extract_details(),
+    rebuilding the month set for every line, for comparison.
+    """
+    def search(self, line):
+        months = set()
+        for m in ['January', 'February', 'March', 'April',
+                  'May', 'June', 'July', 'August',
+                  'September', 'October', 'November', 'December']:
+            months.update((m, m.upper(), m[:3], m[:3].upper()))
+        return not set(line.split(' ')).isdisjoint(months)
+
+
+def bench_extract(names=None, directory=FIXTURES, repeat=20):
+    """
+    Time extract_details() per page on saved event pages, parsed beforehand,
+    and for RiseStronger also with the previous date-line check.
+
+    Parameters
+    ----------
+    names : list, default None
+        Names of the scrapers to benchmark, if None every scraper with
+        fixtures is used.
+    directory : str, default FIXTURES
+        Root directory of the fixtures, see save_fixtures().
+    repeat : int, default 20
+        Number of passes over the fixtures; the fastest pass is reported.
+    """
+    import risestronger
+
+    def best_time(scraper, pages):
+        #  extract_details() edits the soup, so every pass gets fresh soups,
+        #  parsed outside the timed loop
+        best = float('inf')
+        for _ in range(repeat):
+            soups = [scraper.make_soup(data, scraper.event_strainer())
+                     for data in pages]
+            start = time.perf_counter()
+            for soup in soups:
+                scraper.extract_details(soup)
+            best = min(best, time.perf_counter() - start)
+        return 1e3 * best / len(pages)
+
+    names = sorted(SCRAPERS) if names is None else names
+    row = '{:<16} {:<10} {:>6} {:>10}'
+    print(row.format('scraper', 'matchers', 'pages', 'ms/page'))
+    for name in names:
+        pages = load_fixtures(name, directory)
+        if not pages:
+            print('Skipping {}: no fixtures, see save-fixtures'.format(name))
+            continue
+        scraper = get_scraper(name)
+        print(row.format(name, 'compiled', len(pages),
+                         '{:.3f}'.format(best_time(scraper, pages))))
+        if name == 'risestronger':
+            date_line = risestronger.DATE_LINE
+            risestronger.DATE_LINE = LegacyDateLine()
+            try:
+                print(row.format(name, 'legacy', len(pages),
+                                 '{:.3f}'.format(best_time(scraper, pages))))
+            finally:
+                risestronger.DATE_LINE = date_line
+
+
+def synthetic_history(rows, urls, seed=0):
+    """
+    Return a DataFrame of `rows` snapshot rows spread over `urls` distinct
+    URLs, with random LAST_UPDATED timestamps over a year as strings (as
+    read from CSV).
+    """
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    url_ids = rng.integers(0, urls, size=rows)
+    seconds = rng.integers(0, 365 * 24 * 3600, size=rows)
+    last_updated = (pd.Timestamp('2017-05-01') +
+                    pd.to_timedelta(seconds, unit='s'))
+    return pd.DataFrame({
+        'URL': pd.Series(url_ids).map('https://example.org/events/{}'.format),
+        'LAST_UPDATED': last_updated.strftime('%Y-%m-%d %H:%M:%S.%f'),
+        'NAME': pd.Series(url_ids).map('EVENT {}'.format)})
+
+
+def dedup_loop(events_df):
+    """
+    The previous per-group dedup of combine_csv_files, for comparison.
+    """
+    import numpy as np
+    is_latest = np.array([True] * events_df.shape[0])
+    for key, group in events_df.groupby('URL'):
+        if group.shape[0] > 1:
+            latest_ts = group.LAST_UPDATED.max()
+            is_latest[group[group.LAST_UPDATED < latest_ts].index] = False
+    return events_df.loc[is_latest].reset_index(drop=True)
+
+
+def bench_dedup(rows=1000000, urls=50000, loop_limit=200000):
+    """
+    Compare the per-group loop dedup with latest_per_url() on a synthetic
+    history.
+
+    Parameters
+    ----------
+    rows : int, default 1000000
+        Number of snapshot rows.
+    urls : int, default 50000
+        Number of distinct URLs.
+    loop_limit : int, default 200000
+        The loop is timed on the first loop_limit rows only, and checked to
+        give the same result as latest_per_url() there.
+    """
+    from events import latest_per_url
+
+    history = synthetic_history(rows, urls)
+    print('Synthetic history: {} rows, {} URLs'.format(rows, urls))
+
+    start = time.perf_counter()
+    latest = latest_per_url(history)
+    print('latest_per_url : {:>8.3f} s for {} rows -> {} events'.format(
+        time.perf_counter() - start, rows, len(latest)))
+
+    sample = history.iloc[:loop_limit]
+    start = time.perf_counter()
+    expected = dedup_loop(sample)
+    print('groupby loop   : {:>8.3f} s for {} rows -> {} events'.format(
+        time.perf_counter() - start, len(sample), len(expected)))
+    same = latest_per_url(sample).equals(expected)
+    print('Same result on {} rows: {}'.format(len(sample), same))
+
+
+def bench_merge(snapshots=(5, 10, 20), rows=5000, chunksize=2000):
+    """
+    Compare peak memory of combining snapshots in memory against the
+    chunked merge, as the number of snapshots grows.
+
+    Each synthetic snapshot holds the same `rows` events with a 1 kB
+    DESCRIPTION and a later LAST_UPDATED, like consecutive daily runs.
+
+    Parameters
+    ----------
+    snapshots : list-like
+        Numbers of snapshot files to merge.
+    rows : int, default 5000
+        Events per snapshot.
+    chunksize : int, default 2000
+        Rows read at a time by the chunked merge.
+    """
+    import tempfile
+    import pandas as pd
+    from basewebscraper import BaseWebScraper
+    from snapshots import merge_snapshots
+
+    class _Scraper(BaseWebScraper):
+        def get_event_urls(self):
+            return []
+
+        def extract_details(self, soup):
+            return {}
+
+    scraper = _Scraper()
+    row = '{:>10} {:>14} {:>14} {:>14} {:>14}'
+    print(row.format('snapshots', 'combine [s]', 'combine [MB]',
+                     'merge [s]', 'merge [MB]'))
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for n in range(max(snapshots)):
+            df = synthetic_history(rows, rows, seed=n)
+            df['URL'] = ['https://example.org/events/{}'.format(i)
+                         for i in range(rows)]
+            df['LAST_UPDATED'] = str(pd.Timestamp('2017-05-01') +
+                                     pd.Timedelta(days=n))
+            df['DESCRIPTION'] = 'x' * 1000
+            path = os.path.join(tmp, 'snapshot_{:03d}.csv'.format(n))
+            df.to_csv(path, index=False)
+            files.append(path)
+        for n in snapshots:
+            t_old, m_old = measure(scraper.combine_csv_files, files[:n])
+            t_new, m_new = measure(merge_snapshots, files[:n],
+                                   os.path.join(tmp, 'merged.csv'),
+                                   chunksize=chunksize)
+            print(row.format(n, '{:.2f}'.format(t_old),
+                             '{:.1f}'.format(m_old / 1e6),
+                             '{:.2f}'.format(t_new),
+                             '{:.1f}'.format(m_new / 1e6)))
+
+
+def bench_datetimes(csv_files=None, repeat=3):
+    """
+    Compare row by row dateutil parsing of DATE_TIME with
+    normalize_date_times(), with a cold and a warm cache, on every snapshot.
+    """
+    import pandas as pd
+    import datetimes
+
+    csv_files = csv_files or scraped_csv_files()
+    history = pd.concat([pd.read_csv(f, usecols=['DATE_TIME', 'SOURCE'])
+                         for f in csv_files], ignore_index=True)
+    print('{} snapshots: {} rows, {} distinct DATE_TIMEs'.format(
+        len(csv_files), len(history), history['DATE_TIME'].nunique()))
+
+    def cold():
+        datetimes.clear_cache()
+        return datetimes.normalize_date_times(history)
+
+    timings = [('row by row', datetimes.parse_date_times_slow,
+                history['DATE_TIME']),
+               ('cold cache', cold),
+               ('warm cache', datetimes.normalize_date_times, history)]
+    for label, func, *args in timings:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(*args)
+        print('{:<10} : {:>8.3f} s'.format(
+            label, (time.perf_counter() - start) / repeat))
+
+    slow = datetimes.parse_date_times_slow(history['DATE_TIME'])
+    fast = datetimes.normalize_date_times(history)
+    same = all(fast[c].equals(slow[c]) for c in ('START', 'END')) and \
+        fast['TZ'].fillna('').equals(slow['TZ'].fillna(''))
+    print('Same result: {}, START parsed for {} of {} rows'.format(
+        same, fast['START'].notna().sum(), history['DATE_TIME'].notna().sum()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    p = commands.add_parser('records',
+                            help='DataFrame append vs EventRecords buffer')
+    p.add_argument('--sizes', type=int, nargs='+',
+                   default=[250, 500, 1000, 4000, 16000, 64000])
+    p.add_argument('--legacy-limit', type=int, default=1000)
+    p.set_defaults(run=lambda a: bench_records(sizes=a.sizes,
+                                               legacy_limit=a.legacy_limit))
+
+    p = commands.add_parser('save-fixtures',
+                            help='save event pages as HTML fixtures')
+    p.add_argument('names', nargs='+', choices=sorted(SCRAPERS))
+    p.add_argument('-n', type=int, default=20)
+    p.add_argument('--fixtures', default=FIXTURES)
+    p.set_defaults(run=lambda a: save_fixtures(a.names, n=a.n,
+                                               directory=a.fixtures))
+
+    p = commands.add_parser('parse',
+                            help='parse time per page for each parser')
+    p.add_argument('names', nargs='*', help='scrapers, default all')
+    p.add_argument('--fixtures', default=FIXTURES)
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(run=lambda a: bench_parse(a.names or None,
+                                             directory=a.fixtures,
+                                             repeat=a.repeat))
+
+    p = commands.add_parser('extract',
+                            help='extract_details time per page')
+    p.add_argument('names', nargs='*', help='scrapers, default all')
+    p.add_argument('--fixtures', default=FIXTURES)
+    p.add_argument('--repeat', type=int, default=20)
+    p.set_defaults(run=lambda a: bench_extract(a.names or None,
+                                               directory=a.fixtures,
+                                               repeat=a.repeat))
+
+    p = commands.add_parser('dedup',
+                            help='latest-per-URL dedup on synthetic history')
+    p.add_argument('--rows', type=int, default=1000000)
+    p.add_argument('--urls', type=int, default=50000)
+    p.add_argument('--loop-limit', type=int, default=200000)
+    p.set_defaults(run=lambda a: bench_dedup(a.rows, a.urls, a.loop_limit))
+
+    p = commands.add_parser('merge',
+                            help='in-memory combine vs chunked merge')
+    p.add_argument('--snapshots', type=int, nargs='+', default=[5, 10, 20])
+    p.add_argument('--rows', type=int, default=5000)
+    p.add_argument('--chunksize', type=int, default=2000)
+    p.set_defaults(run=lambda a: bench_merge(a.snapshots, a.rows,
+                                             a.chunksize))
+
+    p = commands.add_parser('datetimes',
+                            help='row by row vs vectorized DATE_TIME parsing')
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(run=lambda a: bench_datetimes(repeat=a.repeat))
+
+    args = parser.parse_args()
+    args.run(args)
@@ -1,5 +1,9 @@
 from basewebscraper import BaseWebScraper
 import logging
+import re
+
+
+DATE = re.compile(r'\d+/\d+/20\d+')
 
 
 class CallToActivismScraper(BaseWebScraper):
@@ -35,7 +39,6 @@ class CallToActivismScraper(BaseWebScraper):
         details : dict
             Dictionary containing event-info.
         """
-        import re
         details = dict()
         details['SOURCE'] = 'calltoactivism.com'
         details['NOTES'] = 'Parsed www.calltoactivism.com for training data'
@@ -62,7 +65,7 @@ class CallToActivismScraper(BaseWebScraper):
         event_date_time = None
         for h in soup.find_all('h2'):
             txt = h.get_text()
-            match = re.compile('\d+/\d+/20\d+').search(txt)
+            match = DATE.search(txt)
             if match:
                 event_date_time = txt[match.start():match.end()]
         details['DATE_TIME'] = event_date_time
@@ -100,7 +103,7 @@ class CallToActivismScraper(BaseWebScraper):
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     #  init scraper
-    scraper = CallToActivismScraper()
+    scraper = CallToActivismScraper(cache_dir='http_cache')
     #  scrap and save current events
     current_events_df = scraper.scrape()
     filename = scraper.save_csv(current_events_df)
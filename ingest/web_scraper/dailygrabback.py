@@ -1,11 +1,27 @@
+import logging
+import re
 from basewebscraper import BaseWebScraper
 
 
+TAG_HREF = re.compile(r'\?tag=')
+FACEBOOK_HREF = re.compile('facebook.com/events')
+
+
 class DailyGrabBackScraper(BaseWebScraper):
     _name = 'dailygrabback'
     _root_url = 'https://www.dailygrabback.com'
+    #  extract_details() only reads the post and its og:* meta tags
+    _parse_only = ['article', 'meta']
 
     def get_event_urls(self):
+        """
+        Return URLs of event-pages on website.
+
+        Listing pages are walked from newest to oldest. When scrape() is given
+        known events and no max_age, the walk stops at the first page whose
+        events are all known, since older pages of the archive never change.
+        With max_age every page is walked, so old events can be re-fetched.
+        """
 
         def get_events_on_page(soup):
             event_urls = []
@@ -33,7 +49,13 @@ class DailyGrabBackScraper(BaseWebScraper):
         while next_page_url is not None:
             logging.debug('Scraping ' + next_page_url)
             soup = self.get_soup(self._root_url + next_page_url)
-            event_urls.extend(get_events_on_page(soup))
+            page_urls = get_events_on_page(soup)
+            event_urls.extend(page_urls)
+            if page_urls and self._known_urls.issuperset(
+                    self._root_url + e for e in page_urls):
+                logging.debug('All events on {} already seen, stopping'
+                              .format(next_page_url))
+                break
             next_page_url = get_older_page(soup)
 
         event_urls = [self._root_url + e for e in event_urls]
@@ -53,7 +75,6 @@ class DailyGrabBackScraper(BaseWebScraper):
         details : dict
             Dictionary containing event-info.
         """
-        import re
         details = dict()
         details['SOURCE'] = 'dailygrabback.com'
         details['NOTES'] = 'Parsed www.dailygrabback.com for training data'
@@ -87,7 +108,7 @@ class DailyGrabBackScraper(BaseWebScraper):
         try:
             event_tags = [a.get_text()
                           for a in art.find_all('a',
-                                                href=re.compile('\?tag='))]
+                                                href=TAG_HREF)]
         except AttributeError:
             event_tags = None
 
@@ -112,7 +133,7 @@ class DailyGrabBackScraper(BaseWebScraper):
                        for a in art.find_all(
                            'a',
                            target='_blank',
-                           href=re.compile('facebook.com/events'))]
+                           href=FACEBOOK_HREF)]
         details['SOCIAL'] = event_links
 
         # Location
@@ -153,12 +174,13 @@ if __name__ == '__main__':
         - Save to CSV file
         - Find all previously saved CSV files and combine into single DataFrame
     """
-    import logging
     logging.basicConfig(level=logging.INFO)
     #  init scraper
     scraper = DailyGrabBackScraper()
-    #  scrap and save current events
-    current_events_df = scraper.scrape()
-    filename = scraper.save_csv(current_events_df)
+    #  scrap and save events not captured by previous runs
+    known_events_df = scraper.combine_csv_files()
+    current_events_df = scraper.scrape(known=known_events_df)
+    filename = scraper.save_csv(current_events_df, delta=True,
+                                removals=False)
     #  combine all events (for training?)
     all_events_df = scraper.combine_csv_files()
@@ -0,0 +1,218 @@
+"""
+Normalization of the free-text DATE_TIME column into typed columns.
+
+Each scraper writes DATE_TIME in its own shape, e.g.
+
+    risestronger.org      'Jun 15, 2017  6:00 PM - Jun 15, 2017  7:15 PM EDT'
+    resistancenearme.org  'Tue Oct 24 2017\\n    2:00 PM, EDT  '
+    FiveMinutes           'March 01, 2017'
+    dailygrabback.com     'May  3, 2017'
+    calltoactivism.com    '5/9/2017'
+
+normalize_date_times() turns it into START and END (naive local wall-clock
+timestamps) and TZ (the time zone as written, e.g. 'EDT' or
+'America/Chicago'). Every distinct string is parsed once: known shapes are
+parsed together with one regular expression and one pd.to_datetime() call
+per shape, trying the shape of the row's SOURCE first, and only strings
+matching no shape are parsed one by one with dateutil. Parsed strings are
+cached, so a history of snapshots repeating the same DATE_TIMEs is mostly
+served from the cache.
+"""
+import logging
+import re
+import warnings
+
+import pandas as pd
+
+
+#  shapes of DATE_TIME: regex with start, end and tz groups, and the formats
+#  of the start and end groups once whitespace is collapsed
+_DATE = r'[A-Z][a-z]{2} \d{1,2}, \d{4}'
+_TIME = r'\d{1,2}:\d{2} [AP]M'
+FAST_PATHS = {
+    'range': (re.compile(r'^(?P<start>{0} {1}) -(?: (?P<end>{0} {1}))?'
+                         r'(?: (?P<tz>[A-Z]{{2,5}}))?$'.format(_DATE, _TIME)),
+              '%b %d, %Y %I:%M %p'),
+    'dayline': (re.compile(r'^(?:[A-Z][a-z]{2},? )?(?P<start>[A-Z][a-z]{2} '
+                           r'\d{1,2} \d{4}(?: ' + _TIME + r')?)'
+                           r'(?:,? (?P<tz>[A-Z]{2,5}|[A-Za-z_]+/[A-Za-z_/]+))?'
+                           r'$'),
+                '%b %d %Y %I:%M %p'),
+    'dateline': (re.compile(r'^(?P<start>[A-Z][a-z]+ \d{1,2}, \d{4})$'),
+                 '%B %d, %Y'),
+    'numeric': (re.compile(r'^(?P<start>\d{1,2}/\d{1,2}/\d{4})$'),
+                '%m/%d/%Y'),
+}
+#  shapes tried first for each SOURCE
+SOURCE_PATHS = {'risestronger.org': 'range',
+                'resistancenearme.org': 'dayline',
+                'FiveMinutes': 'dateline',
+                'dailygrabback.com': 'dateline',
+                'calltoactivism.com': 'numeric'}
+#  time zone written at the end of a DATE_TIME
+_TZ = re.compile(r',?\s*\b([A-Z]{2,5}|[A-Za-z_]+/[A-Za-z_/]+)$')
+
+#  raw DATE_TIME -> (start, end, tz)
+_cache = dict()
+
+
+def clear_cache():
+    """
+    Forget every DATE_TIME parsed so far.
+    """
+    _cache.clear()
+
+
+def _to_datetime(values, date_format):
+    """
+    Parse values with date_format, falling back to the date part alone for
+    values without a time.
+    """
+    parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+    if '%I' in date_format:
+        date_only = date_format.split(' %I')[0]
+        missing = parsed.isna() & values.notna()
+        if missing.any():
+            parsed[missing] = pd.to_datetime(values[missing],
+                                             format=date_only,
+                                             errors='coerce')
+    return parsed
+
+
+def _fast_path(texts, name):
+    """
+    Parse texts matching the shape name.
+
+    Returns
+    -------
+    parsed : DataFrame
+        start, end and tz of the texts that matched, indexed like texts.
+    """
+    regex, date_format = FAST_PATHS[name]
+    groups = texts.str.extract(regex)
+    for group in ('end', 'tz'):
+        if group not in groups.columns:
+            groups[group] = None
+    groups = groups.loc[groups['start'].notna()]
+    start = _to_datetime(groups['start'], date_format)
+    end = _to_datetime(groups['end'], date_format)
+    parsed = pd.DataFrame({'start': start, 'end': end,
+                           'tz': groups['tz'].astype(object)})
+    return parsed.loc[start.notna()]
+
+
+def _slow_path(text):
+    """
+    Parse text with dateutil, splitting ranges on ' - '.
+    """
+    from dateutil import parser
+
+    tz = None
+    match = _TZ.search(text)
+    if match and match.group(1).upper() not in ('AM', 'PM'):
+        tz = match.group(1)
+        text = text[:match.start()]
+    values = []
+    for part in text.split(' -', 1):
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                values.append(pd.Timestamp(parser.parse(part)))
+        except (ValueError, OverflowError):
+            values.append(pd.NaT)
+    if len(values) == 1:
+        values.append(pd.NaT)
+    return values[0], values[1], tz
+
+
+def parse_date_times(values, sources=None):
+    """
+    Parse DATE_TIME values.
+
+    Parameters
+    ----------
+    values : Series
+        DATE_TIME values.
+    sources : Series, default None
+        SOURCE of each value, used to pick the shape tried first.
+
+    Returns
+    -------
+    date_times : DataFrame
+        START, END and TZ columns, with the index of values.
+    """
+    raw = values.astype(object).where(values.notna(), None)
+    if sources is None:
+        sources = pd.Series(None, index=values.index, dtype=object)
+    pairs = pd.DataFrame({'raw': raw, 'source': sources.astype(object)})
+    pairs = pairs.loc[pairs['raw'].notna()].drop_duplicates('raw')
+    todo = pairs.loc[~pairs['raw'].isin(_cache.keys())]
+    logging.debug('Parsing {} of {} distinct DATE_TIMEs'.format(
+        len(todo), len(pairs)))
+
+    if len(todo):
+        texts = pd.Series(todo['raw'].astype(str).to_numpy(),
+                          index=todo['raw'].to_numpy())
+        texts = texts.str.replace(r'\s+', ' ', regex=True).str.strip()
+        source_paths = todo['source'].map(SOURCE_PATHS).to_numpy()
+        results = []
+        #  shape of the source first, then every shape on what is left
+        for name in FAST_PATHS:
+            preferred = texts.loc[source_paths == name]
+            if len(preferred):
+                results.append(_fast_path(preferred, name))
+        done = set(i for r in results for i in r.index)
+        for name in FAST_PATHS:
+            left = texts.loc[[t not in done for t in texts.index]]
+            if not len(left):
+                break
+            result = _fast_path(left, name)
+            results.append(result)
+            done.update(result.index)
+        for result in results:
+            _cache.update(zip(result.index, zip(result['start'],
+                                                result['end'],
+                                                result['tz'])))
+        for key, text in texts.items():
+            if key not in done:
+                _cache[key] = _slow_path(text)
+
+    table = pd.DataFrame([_cache[r] for r in pairs['raw']],
+                         index=pairs['raw'].to_numpy(),
+                         columns=['START', 'END', 'TZ'])
+    if not len(table):
+        table = pd.DataFrame(columns=['START', 'END', 'TZ'])
+    date_times = table.reindex(raw.to_numpy())
+    date_times.index = values.index
+    for c in ('START', 'END'):
+        date_times[c] = pd.to_datetime(date_times[c])
+    return date_times
+
+
+def normalize_date_times(events_df):
+    """
+    Return a copy of events_df with START, END and TZ columns parsed from
+    DATE_TIME.
+
+    START and END are naive timestamps in the local time of the event, END
+    is NaT if DATE_TIME gives no end, and START is NaT if DATE_TIME could not
+    be parsed. TZ is the time zone as written in DATE_TIME, or missing.
+    """
+    df = events_df.copy()
+    date_times = parse_date_times(
+        df['DATE_TIME'], df['SOURCE'] if 'SOURCE' in df.columns else None)
+    for c in date_times.columns:
+        df[c] = date_times[c]
+    return df
+
+
+def parse_date_times_slow(values):
+    """
+    Parse DATE_TIME values one by one with dateutil, without the fast paths
+    or cache (used to benchmark parse_date_times()).
+    """
+    return pd.DataFrame([_slow_path(' '.join(str(v).split()))
+                         if v is not None and v == v else (pd.NaT, pd.NaT,
+                                                           None)
+                         for v in values],
+                        index=values.index, columns=['START', 'END', 'TZ'])
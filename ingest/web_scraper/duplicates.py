@@ -0,0 +1,408 @@
+"""
+Near-duplicate detection of events across sources.
+
+The same action is often posted by several websites under different URLs and
+with slightly different wording. DuplicateIndex finds such events by the
+similarity of their NAME and DESCRIPTION: each event is cut into word
+shingles, summarized by a MinHash signature whose agreement with another
+signature estimates the Jaccard similarity of their shingles, and filed in an
+LSH index (the signature split into bands, one hash table per band). A new
+event is only compared with the events sharing at least one band with it, so
+checking it takes about the same time however many events are indexed.
+
+Events whose estimated similarity reaches `threshold` are put in the same
+cluster. Cluster ids are stable integers: a cluster keeps the id of its
+oldest event. The index is saved as a compressed .npz file and updated
+incrementally, only hashing events that are new or whose CONTENT_HASH
+changed since the last update.
+
+Typical Usage:
+    python duplicates.py                    # index scraped_data/ snapshots
+    python duplicates.py --threshold 0.7 --show 20
+"""
+import argparse
+import glob
+import logging
+import os
+import re
+import zlib
+
+import numpy as np
+
+from events import as_text
+
+
+SCRAPED_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'scraped_data')
+DEFAULT_PATH = os.path.join(SCRAPED_DATA, 'duplicates.npz')
+#  column holding the cluster ids returned by DuplicateIndex.cluster_ids()
+CLUSTER_COLUMN = 'CLUSTER'
+#  hashes are computed modulo this Mersenne prime, so products fit in uint64
+_PRIME = (1 << 31) - 1
+_WORD = re.compile(r'\w+')
+
+
+def shingles(text, size=3):
+    """
+    Return the hashes of the word shingles of text.
+
+    Parameters
+    ----------
+    text : str
+        Text to shingle, compared case-insensitively and ignoring
+        punctuation.
+    size : int, default 3
+        Number of words per shingle. Texts with fewer words are a single
+        shingle.
+
+    Returns
+    -------
+    hashes : ndarray
+        Distinct CRC-32 hashes of the shingles, empty if text has no words.
+    """
+    words = _WORD.findall((text or '').lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    grams = set(' '.join(words[i:i + size])
+                for i in range(max(1, len(words) - size + 1)))
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams),
+                       dtype=np.uint64, count=len(grams))
+
+
+def event_text(event):
+    """
+    Return the NAME and DESCRIPTION of an event (a row or a dict) as one
+    text.
+    """
+    return '\n'.join(as_text(event.get(c)) or '' for c in
+                     ('NAME', 'DESCRIPTION'))
+
+
+class DuplicateIndex(object):
+    """
+    MinHash LSH index of events, clustering near-duplicates.
+
+    Parameters
+    ----------
+    num_perm : int, default 128
+        Number of hash functions, i.e. length of the signatures.
+    bands : int, default 32
+        Number of LSH bands, must divide num_perm. More bands find pairs of
+        lower similarity, at the cost of more candidates to check.
+    threshold : float, default 0.5
+        Estimated Jaccard similarity from which events are duplicates.
+    shingle_size : int, default 3
+        Number of words per shingle.
+    seed : int, default 1
+        Seed of the hash functions; indexes are only comparable if built
+        with the same seed.
+    """
+    def __init__(self, num_perm=128, bands=32, threshold=0.5,
+                 shingle_size=3, seed=1):
+        if num_perm % bands:
+            raise ValueError('bands must divide num_perm')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+        state = np.random.RandomState(seed)
+        self._a = state.randint(1, _PRIME, num_perm).astype(np.uint64)
+        self._b = state.randint(0, _PRIME, num_perm).astype(np.uint64)
+        #  per event, in the order they were first added
+        self._keys = []
+        self._hashes = []
+        self._signatures = []
+        self._parents = []
+        self._ordinals = dict()
+        #  one table per band: band bytes -> ordinals
+        self._tables = [dict() for _ in range(bands)]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._ordinals
+
+    def signature(self, text):
+        """
+        Return the MinHash signature of text, or None if text has no words.
+        """
+        hashes = shingles(text, self.shingle_size) % _PRIME
+        if not len(hashes):
+            return None
+        permuted = (self._a[:, None] * hashes[None, :] +
+                    self._b[:, None]) % _PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _bands(self, signature):
+        rows = self.num_perm // self.bands
+        return [signature[i * rows:(i + 1) * rows].tobytes()
+                for i in range(self.bands)]
+
+    def _candidates(self, signature):
+        candidates = set()
+        for table, band in zip(self._tables, self._bands(signature)):
+            candidates.update(table.get(band, ()))
+        return candidates
+
+    def _similarity(self, signature, ordinal):
+        other = self._signatures[ordinal]
+        if other is None:
+            return 0.0
+        return float(np.mean(signature == other))
+
+    def query(self, text):
+        """
+        Return the indexed events similar to text.
+
+        Returns
+        -------
+        matches : list
+            (key, estimated similarity) of the events whose similarity
+            reaches threshold, most similar first.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return []
+        matches = []
+        for ordinal in self._candidates(signature):
+            similarity = self._similarity(signature, ordinal)
+            if similarity >= self.threshold:
+                matches.append((self._keys[ordinal], similarity))
+        return sorted(matches, key=lambda m: (-m[1], m[0]))
+
+    def _find(self, ordinal):
+        root = ordinal
+        while self._parents[root] != root:
+            root = self._parents[root]
+        while self._parents[ordinal] != root:
+            self._parents[ordinal], ordinal = root, self._parents[ordinal]
+        return root
+
+    def _union(self, first, second):
+        first, second = self._find(first), self._find(second)
+        if first != second:
+            #  the older event is the root, so cluster ids stay stable
+            self._parents[max(first, second)] = min(first, second)
+
+    def _insert(self, ordinal, signature):
+        self._signatures[ordinal] = signature
+        if signature is None:
+            return
+        for table, band in zip(self._tables, self._bands(signature)):
+            table.setdefault(band, []).append(ordinal)
+
+    def add(self, key, text, content_hash=None):
+        """
+        Index an event and return its cluster id.
+
+        An event already indexed under key is only hashed again if
+        content_hash differs from the one it was added with. A changed event
+        joins the clusters of the events it is now similar to, but clusters
+        are never split.
+
+        Parameters
+        ----------
+        key : str
+            Unique key of the event, e.g. its URL.
+        text : str
+            Text of the event, see event_text().
+        content_hash : str, default None
+            CONTENT_HASH of the event.
+
+        Returns
+        -------
+        cluster : int
+            Cluster id of the event.
+        """
+        ordinal = self._ordinals.get(key)
+        if ordinal is not None:
+            if content_hash is not None and \
+                    content_hash == self._hashes[ordinal]:
+                return self._find(ordinal)
+        else:
+            ordinal = len(self._keys)
+            self._ordinals[key] = ordinal
+            self._keys.append(key)
+            self._hashes.append(None)
+            self._signatures.append(None)
+            self._parents.append(ordinal)
+        self._hashes[ordinal] = content_hash
+
+        signature = self.signature(text)
+        if signature is not None:
+            for other in self._candidates(signature):
+                if other != ordinal and \
+                        self._similarity(signature, other) >= self.threshold:
+                    self._union(ordinal, other)
+        self._insert(ordinal, signature)
+        return self._find(ordinal)
+
+    def update(self, events_df, key='URL'):
+        """
+        Index the events of events_df.
+
+        Rows without a key are skipped. Events already indexed are skipped
+        unless their CONTENT_HASH (if events_df has one) changed.
+
+        Returns
+        -------
+        hashed : int
+            Number of events hashed.
+        """
+        hashed = 0
+        columns = [c for c in (key, 'CONTENT_HASH', 'NAME', 'DESCRIPTION')
+                   if c in events_df.columns]
+        for event in events_df[columns].to_dict('records'):
+            k = event[key]
+            if k is None or k != k:
+                continue
+            content_hash = event.get('CONTENT_HASH')
+            if content_hash != content_hash:
+                content_hash = None
+            ordinal = self._ordinals.get(k)
+            if ordinal is not None and (content_hash is None or
+                                        content_hash == self._hashes[ordinal]):
+                continue
+            self.add(k, event_text(event), content_hash)
+            hashed += 1
+        logging.debug('Hashed {} of {} events'.format(hashed, len(events_df)))
+        return hashed
+
+    def cluster(self, key):
+        """
+        Return the cluster id of the event indexed under key, or None.
+        """
+        ordinal = self._ordinals.get(key)
+        return None if ordinal is None else self._find(ordinal)
+
+    def cluster_ids(self, events_df, key='URL'):
+        """
+        Return the cluster id of every event of events_df.
+
+        Returns
+        -------
+        clusters : Series
+            Nullable integer CLUSTER column with the index of events_df, to
+            be joined onto it, e.g. `events_df.join(index.cluster_ids(df))`.
+            Events not indexed have no cluster.
+        """
+        import pandas as pd
+        roots = [self.cluster(k) for k in events_df[key]]
+        return pd.Series(roots, index=events_df.index, dtype='Int64',
+                         name=CLUSTER_COLUMN)
+
+    def clusters(self, min_size=2):
+        """
+        Return the keys of every cluster with at least min_size events, by
+        cluster id.
+        """
+        members = dict()
+        for ordinal, key in enumerate(self._keys):
+            members.setdefault(self._find(ordinal), []).append(key)
+        return {c: keys for c, keys in members.items()
+                if len(keys) >= min_size}
+
+    def save(self, path=DEFAULT_PATH):
+        """
+        Save the index to path (a .npz file).
+        """
+        signatures = np.zeros((len(self), self.num_perm), dtype=np.uint32)
+        has_signature = np.zeros(len(self), dtype=bool)
+        for ordinal, signature in enumerate(self._signatures):
+            if signature is not None:
+                signatures[ordinal] = signature
+                has_signature[ordinal] = True
+        parents = np.array([self._find(o) for o in range(len(self))],
+                           dtype=np.int64)
+        params = np.array([self.num_perm, self.bands, self.shingle_size,
+                           self.seed], dtype=np.int64)
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f, params=params, threshold=np.array(self.threshold),
+                keys=np.array(self._keys, dtype=str),
+                hashes=np.array(['' if h is None else h
+                                 for h in self._hashes], dtype=str),
+                signatures=signatures, has_signature=has_signature,
+                parents=parents)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """
+        Load an index saved by save().
+        """
+        with np.load(path) as data:
+            num_perm, bands, shingle_size, seed = data['params'].tolist()
+            index = cls(num_perm, bands, float(data['threshold']),
+                        shingle_size, seed)
+            index._keys = data['keys'].tolist()
+            index._hashes = [h or None for h in data['hashes'].tolist()]
+            index._parents = data['parents'].tolist()
+            index._signatures = [None] * len(index._keys)
+            for ordinal, (signature, has_signature) in enumerate(
+                    zip(data['signatures'], data['has_signature'])):
+                index._insert(ordinal, signature if has_signature else None)
+        index._ordinals = {k: o for o, k in enumerate(index._keys)}
+        return index
+
+
+def open_index(path=DEFAULT_PATH, **kwargs):
+    """
+    Load the index saved at path, or create an empty one (with kwargs) if
+    there is none.
+
+    If the saved index was built with parameters other than kwargs (e.g. a
+    different threshold), a warning is logged and an empty index with kwargs
+    is returned instead, so every event is hashed and clustered again on the
+    next update().
+    """
+    if not os.path.exists(path):
+        return DuplicateIndex(**kwargs)
+    index = DuplicateIndex.load(path)
+    changed = sorted(k for k, v in kwargs.items() if getattr(index, k) != v)
+    if changed:
+        logging.warning('{} was built with other {}, rebuilding it'.format(
+            path, ', '.join('{}={}'.format(k, getattr(index, k))
+                            for k in changed)))
+        return DuplicateIndex(**kwargs)
+    return index
+
+
+if __name__ == '__main__':
+    import pandas as pd
+    from events import latest_per_url
+    from snapshots import event_rows
+
+    parser = argparse.ArgumentParser(
+        description='Cluster near-duplicate events across sources.')
+    parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--show', type=int, default=10,
+                        help='number of cross-source clusters printed')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    files = args.files or sorted(glob.glob(os.path.join(SCRAPED_DATA,
+                                                        '*.csv')))
+    events_df = latest_per_url(pd.concat(
+        [event_rows(pd.read_csv(f)) for f in files], ignore_index=True))
+    index = open_index(args.path, threshold=args.threshold)
+    hashed = index.update(events_df)
+    index.save(args.path)
+
+    events_df = events_df.join(index.cluster_ids(events_df))
+    sizes = events_df.groupby(CLUSTER_COLUMN)['SOURCE'].agg(['size',
+                                                             'nunique'])
+    cross = sizes.loc[sizes['nunique'] > 1]
+    print('Hashed {} of {} events, {} clusters of duplicates, {} across '
+          'sources'.format(hashed, len(events_df),
+                           (sizes['size'] > 1).sum(), len(cross)))
+    for cluster in cross.sort_values('size', ascending=False) \
+            .index[:args.show]:
+        print('\nCluster {}:'.format(cluster))
+        for _, event in events_df.loc[events_df[CLUSTER_COLUMN] == cluster] \
+                .iterrows():
+            print('  {: <20} {}'.format(event['SOURCE'],
+                                        str(event['NAME'])[:70]))
@@ -0,0 +1,266 @@
+"""
+Schema of scraped events and helpers for building event DataFrames.
+"""
+import ast
+import hashlib
+import json
+import logging
+
+#  columns written by every scraper, in the order they appear in the CSVs
+EVENT_COLUMNS = ('CONTENT_HASH',
+                 'DATE_TIME',
+                 'DESCRIPTION',
+                 'LAST_UPDATED',
+                 'LOCATION',
+                 'LOCATION_GMAPS',
+                 'NAME',
+                 'NOTES',
+                 'ORGANIZER',
+                 'SOCIAL',
+                 'SOURCE',
+                 'TAGS',
+                 'TYPES',
+                 'URL')
+#  columns whose normalized values make up CONTENT_HASH
+HASH_COLUMNS = ('DATE_TIME',
+                'DESCRIPTION',
+                'LOCATION',
+                'LOCATION_GMAPS',
+                'NAME',
+                'ORGANIZER',
+                'SOCIAL',
+                'SOURCE',
+                'TAGS',
+                'TYPES',
+                'URL')
+#  columns holding lists of strings
+LIST_COLUMNS = ('SOCIAL', 'TAGS', 'TYPES')
+
+
+def as_list(value):
+    """
+    Return value as a list of strings, parsing list reprs read from CSV.
+    """
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    if hasattr(value, 'tolist'):
+        return [str(v) for v in value.tolist()]
+    if value is None or value != value:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return []
+        if value.startswith('['):
+            try:
+                return [str(v) for v in ast.literal_eval(value)]
+            except (ValueError, SyntaxError):
+                pass
+        return [value]
+    return [str(value)]
+
+
+def as_text(value):
+    """
+    Return value as a string, decoding bytes and bytes reprs read from CSV.
+    """
+    if value is None or value != value:
+        return None
+    if isinstance(value, str) and value[:2] in ("b'", 'b"') and \
+            value[-1:] == value[1]:
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+def content_hash(details):
+    """
+    Return a stable hash of the content of an event.
+
+    Only HASH_COLUMNS are hashed, so the hash does not change with
+    LAST_UPDATED or NOTES. Values are normalized first: list reprs read from
+    CSV and real lists hash the same, bytes are decoded and runs of
+    whitespace are collapsed.
+
+    Parameters
+    ----------
+    details : dict
+        Dictionary containing event-info, or a row of an events DataFrame.
+
+    Returns
+    -------
+    hash : str
+        Hex SHA-1 digest.
+    """
+    fields = [_hash_field(c, details.get(c)) for c in HASH_COLUMNS]
+    return hashlib.sha1('\x1f'.join(fields).encode('utf-8')).hexdigest()
+
+
+def _hash_field(column, value):
+    """
+    Return the normalized text of value hashed by content_hash().
+    """
+    if column in LIST_COLUMNS:
+        return json.dumps([' '.join(v.split()) for v in as_list(value)])
+    text = as_text(value)
+    return '' if text is None else ' '.join(text.split())
+
+
+def add_content_hash(events_df):
+    """
+    Return events_df with a CONTENT_HASH column, computing the hash of rows
+    that have none (e.g. snapshots saved before hashes were recorded).
+    """
+    df = events_df.copy()
+    if 'CONTENT_HASH' not in df.columns:
+        df['CONTENT_HASH'] = None
+    missing = df['CONTENT_HASH'].isna().to_numpy()
+    if missing.any():
+        #  normalize column by column, once per distinct string, since list
+        #  and bytes reprs read from CSV repeat a lot
+        rows = df.loc[missing]
+        columns = []
+        for c in HASH_COLUMNS:
+            values = rows[c].tolist() if c in rows.columns \
+                else [None] * len(rows)
+            seen = dict()
+            fields = []
+            for v in values:
+                if isinstance(v, str):
+                    if v not in seen:
+                        seen[v] = _hash_field(c, v)
+                    fields.append(seen[v])
+                else:
+                    fields.append(_hash_field(c, v))
+            columns.append(fields)
+        df.loc[missing, 'CONTENT_HASH'] = [
+            hashlib.sha1('\x1f'.join(fields).encode('utf-8')).hexdigest()
+            for fields in zip(*columns)]
+    return df
+
+
+class EventRecords(object):
+    """
+    Column-oriented buffer of event details.
+
+    Records are appended one at a time into per-column lists and the
+    DataFrame is built once in to_frame(), so collecting n events costs O(n)
+    instead of the O(n^2) of appending to a DataFrame row by row.
+
+    If the buffer has a CONTENT_HASH column, the rows without one are hashed
+    once in to_frame(), see add_content_hash().
+
+    Parameters
+    ----------
+    columns : list-like, default EVENT_COLUMNS
+        Columns of the buffer. Keys missing from a record are stored as None,
+        keys not in columns are added as new columns.
+    """
+    def __init__(self, columns=EVENT_COLUMNS):
+        self.columns = list(columns)
+        self._data = {c: [] for c in self.columns}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, details):
+        """
+        Add a single record.
+
+        Parameters
+        ----------
+        details : dict
+            Dictionary containing event-info, as returned by
+            extract_details().
+        """
+        for key in details:
+            if key not in self._data:
+                self.columns.append(key)
+                self._data[key] = [None] * self._size
+        for c in self.columns:
+            self._data[c].append(details.get(c))
+        self._size += 1
+
+    def extend(self, records):
+        """
+        Add every record in records.
+        """
+        for details in records:
+            self.append(details)
+
+    def to_frame(self):
+        """
+        Build a DataFrame from the buffered records.
+
+        Returns
+        -------
+        events_df : DataFrame
+            DataFrame with one row per record and one column per schema key.
+        """
+        import pandas as pd
+        events_df = pd.DataFrame(self._data, columns=self.columns)
+        if 'CONTENT_HASH' in events_df.columns:
+            events_df = add_content_hash(events_df)
+        return events_df
+
+
+def parse_timestamps(values):
+    """
+    Parse LAST_UPDATED values into naive timestamps.
+
+    Snapshots mix naive local times with times carrying a UTC offset (e.g.
+    '2017-05-17 04:06:01-07:00'); the offset is dropped so all values are
+    compared as local wall-clock times. Unparsable values become NaT.
+
+    Parameters
+    ----------
+    values : Series
+        Strings or timestamps.
+
+    Returns
+    -------
+    timestamps : Series
+        datetime64 Series with the same index.
+    """
+    import pandas as pd
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if getattr(values.dt, 'tz', None) is not None:
+            return values.dt.tz_localize(None)
+        return values
+    text = values.astype(object).where(values.notna(), None).map(
+        lambda v: v if v is None else str(v))
+    text = text.str.replace(r'(?:Z|[+-]\d{2}:?\d{2})$', '', regex=True)
+    return pd.to_datetime(text, errors='coerce', format='mixed')
+
+
+def latest_per_url(events_df):
+    """
+    Keep only the latest version of each event.
+
+    Rows whose LAST_UPDATED is older than the newest LAST_UPDATED of the same
+    URL are dropped; rows tied for the newest, rows without a URL and rows
+    without a LAST_UPDATED are kept. The order of the remaining rows is
+    preserved.
+
+    Parameters
+    ----------
+    events_df : DataFrame
+        Events with URL and LAST_UPDATED columns, possibly from many
+        snapshots.
+
+    Returns
+    -------
+    events_df : DataFrame
+        Deduplicated events, with a fresh index.
+    """
+    last_updated = parse_timestamps(events_df['LAST_UPDATED'])
+    latest = last_updated.groupby(events_df['URL']).transform('max')
+    is_latest = ~(last_updated < latest).to_numpy()
+    logging.debug('Dropping {} duplicate events...'.format(
+        len(is_latest) - is_latest.sum()))
+    return events_df.loc[is_latest].reset_index(drop=True)
@@ -0,0 +1,210 @@
+"""
+Persistent store of the latest version of every scraped event.
+
+Events live in a local SQLite database with a unique index on URL. Saving a
+scrape upserts its events, replacing a stored event only if the new one has
+a later LAST_UPDATED, so the store always holds the latest view and reading
+it is a single indexed query, however many runs have been saved.
+
+Typical Usage:
+    python eventstore.py                    # import scraped_data/ snapshots
+    python eventstore.py events.db a.csv b.parquet
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sqlite3
+
+from events import EVENT_COLUMNS, LIST_COLUMNS, parse_timestamps
+
+
+SCRAPED_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'scraped_data')
+DEFAULT_PATH = os.path.join(SCRAPED_DATA, 'events.db')
+#  LAST_UPDATED is stored as text in this format, so it sorts chronologically
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class EventStore(object):
+    """
+    SQLite-backed event store keyed by URL.
+
+    Parameters
+    ----------
+    path : str, default DEFAULT_PATH
+        Path of the SQLite database, created if missing. ':memory:' keeps
+        the store in memory.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self._create_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def _create_schema(self):
+        columns = ',\n'.join('{} TEXT{}'.format(
+            c, ' PRIMARY KEY' if c == 'URL' else '') for c in EVENT_COLUMNS)
+        with self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS events (\n{})'.format(columns))
+            #  add columns introduced since the store was created
+            existing = set(r[1] for r in
+                           self.conn.execute('PRAGMA table_info(events)'))
+            for c in EVENT_COLUMNS:
+                if c not in existing:
+                    self.conn.execute(
+                        'ALTER TABLE events ADD COLUMN {} TEXT'.format(c))
+            self.conn.execute('CREATE INDEX IF NOT EXISTS events_source '
+                              'ON events (SOURCE, LAST_UPDATED)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS events_updated '
+                              'ON events (LAST_UPDATED)')
+
+    @staticmethod
+    def _to_rows(events_df):
+        """
+        Convert events_df into tuples of column values in EVENT_COLUMNS
+        order.
+        """
+        from snapshots import normalize_events
+        df = normalize_events(events_df)
+        for c in EVENT_COLUMNS:
+            if c not in df.columns:
+                df[c] = [[] for _ in range(len(df))] \
+                    if c in LIST_COLUMNS else None
+        for c in LIST_COLUMNS:
+            df[c] = [json.dumps(v) for v in df[c]]
+        last_updated = df['LAST_UPDATED'].dt.strftime(TIMESTAMP_FORMAT)
+        df['LAST_UPDATED'] = last_updated.astype(object).where(
+            last_updated.notna(), None)
+        df = df[list(EVENT_COLUMNS)].astype(object)
+        df = df.where(df.notna(), None)
+        return list(df.itertuples(index=False, name=None))
+
+    def upsert(self, events_df):
+        """
+        Insert events, replacing stored events with the same URL if the new
+        version has a later LAST_UPDATED.
+
+        Parameters
+        ----------
+        events_df : DataFrame
+            Events to store. Rows without a URL are skipped.
+
+        Returns
+        -------
+        num_rows : int
+            Number of rows inserted or updated.
+        """
+        rows = [r for r in self._to_rows(events_df)
+                if r[EVENT_COLUMNS.index('URL')] is not None]
+        if len(rows) < len(events_df):
+            logging.warning('Skipping {} events without URL'.format(
+                len(events_df) - len(rows)))
+        updates = ', '.join('{0} = excluded.{0}'.format(c)
+                            for c in EVENT_COLUMNS if c != 'URL')
+        sql = ('INSERT INTO events ({}) VALUES ({}) '
+               'ON CONFLICT (URL) DO UPDATE SET {} '
+               'WHERE events.LAST_UPDATED IS NULL '
+               'OR excluded.LAST_UPDATED > events.LAST_UPDATED'
+               .format(', '.join(EVENT_COLUMNS),
+                       ', '.join('?' * len(EVENT_COLUMNS)),
+                       updates))
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(sql, rows)
+        num_rows = self.conn.total_changes - before
+        logging.info('Upserted {} of {} events into {}'.format(
+            num_rows, len(rows), self.path))
+        return num_rows
+
+    def import_snapshots(self, files):
+        """
+        Upsert the events of CSV or Parquet snapshot files, e.g. to build the
+        store from the existing scraped_data/ archive. Removals recorded in
+        delta snapshots are skipped.
+        """
+        from snapshots import event_rows, read_snapshot
+        for f in files:
+            logging.debug('Importing snapshot {}'.format(f))
+            self.upsert(event_rows(read_snapshot(f)))
+
+    def latest(self, source=None, updated_since=None, updated_until=None,
+               columns=None):
+        """
+        Return the stored events, optionally filtered by SOURCE and
+        LAST_UPDATED range.
+
+        Parameters
+        ----------
+        source : str or list, default None
+            Only return events from these SOURCEs.
+        updated_since, updated_until : str or Timestamp, default None
+            Only return events with LAST_UPDATED in
+            [updated_since, updated_until).
+        columns : list, default None
+            Columns to return, if None all columns are returned.
+
+        Returns
+        -------
+        events_df : DataFrame
+            Events with list columns decoded and LAST_UPDATED as timestamps.
+        """
+        import pandas as pd
+        columns = list(EVENT_COLUMNS if columns is None else columns)
+        unknown = set(columns) - set(EVENT_COLUMNS)
+        if unknown:
+            raise ValueError('Unknown columns {}'.format(sorted(unknown)))
+
+        where, params = [], []
+        if source is not None:
+            sources = [source] if isinstance(source, str) else list(source)
+            where.append('SOURCE IN ({})'.format(
+                ', '.join('?' * len(sources))))
+            params.extend(sources)
+        if updated_since is not None:
+            where.append('LAST_UPDATED >= ?')
+            params.append(
+                pd.Timestamp(updated_since).strftime(TIMESTAMP_FORMAT))
+        if updated_until is not None:
+            where.append('LAST_UPDATED < ?')
+            params.append(
+                pd.Timestamp(updated_until).strftime(TIMESTAMP_FORMAT))
+        sql = 'SELECT {} FROM events'.format(', '.join(columns))
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+
+        df = pd.DataFrame(self.conn.execute(sql, params).fetchall(),
+                          columns=columns)
+        for c in LIST_COLUMNS:
+            if c in df.columns:
+                df[c] = [json.loads(v) if v else [] for v in df[c]]
+        if 'LAST_UPDATED' in df.columns:
+            df['LAST_UPDATED'] = parse_timestamps(df['LAST_UPDATED'])
+        return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Import snapshots into an event store.')
+    parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    files = args.files or sorted(glob.glob(os.path.join(SCRAPED_DATA,
+                                                        '*.csv')))
+    with EventStore(args.path) as store:
+        store.import_snapshots(files)
+        print('{} holds {} events'.format(args.path, len(store)))
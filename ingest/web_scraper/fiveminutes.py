@@ -91,9 +91,11 @@ class FiveMinutesScraper(BaseWebScraper):
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     #  init scraper
-    scraper = FiveMinutesScraper()
-    #  scrap and save current events
-    current_events_df = scraper.scrape()
-    filename = scraper.save_csv(current_events_df)
+    scraper = FiveMinutesScraper(cache_dir='http_cache')
+    #  scrap and save events not captured by previous runs
+    known_events_df = scraper.combine_csv_files()
+    current_events_df = scraper.scrape(known=known_events_df)
+    filename = scraper.save_csv(current_events_df, delta=True,
+                                removals=False)
     #  combine all events (for training?)
     all_events_df = scraper.combine_csv_files()
@@ -0,0 +1,70 @@
+"""
+Local stand-in server that serves saved fixtures over HTTP.
+
+Scrapers can be pointed at it instead of the real websites, e.g. to run
+ResistanceNearMeScraper.scrape_feed() against the saved Firebase JSON.
+
+Typical Usage:
+    python fixtureserver.py --port 8000
+    python resistancenearme.py --feed \
+        http://localhost:8000/resistancenearme/townHalls.json
+"""
+from functools import partial
+import argparse
+import http.server
+import os
+import threading
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures')
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(directory=FIXTURES, host='127.0.0.1', port=0):
+    """
+    Serve directory over HTTP from a background thread.
+
+    Parameters
+    ----------
+    directory : str, default FIXTURES
+        Directory whose files are served.
+    host : str, default '127.0.0.1'
+        Address to bind to.
+    port : int, default 0
+        Port to bind to, 0 picks a free port.
+
+    Returns
+    -------
+    server, base_url : tuple
+        The running http.server.ThreadingHTTPServer (call shutdown() to stop
+        it) and the URL it serves directory under.
+    """
+    handler = partial(_QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = 'http://{}:{}'.format(*server.server_address[:2])
+    return server, base_url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--directory', default=FIXTURES)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    handler = partial(http.server.SimpleHTTPRequestHandler,
+                      directory=args.directory)
+    server = http.server.ThreadingHTTPServer((args.host, args.port), handler)
+    print('Serving {} on http://{}:{}'.format(args.directory, args.host,
+                                              args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
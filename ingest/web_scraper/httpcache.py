@@ -0,0 +1,231 @@
+"""
+On-disk HTTP cache for conditional GET requests.
+
+For every cached URL the response body is stored together with its
+validators (ETag, Last-Modified), so a later request can be sent with
+If-None-Match/If-Modified-Since and a 304 Not Modified answer reuses the
+stored body. The details extracted from a body can be stored alongside it,
+which lets scrape() skip parsing pages that did not change.
+
+The cache is bounded in size and evicts least recently used entries.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class HTTPCache(object):
+    """
+    Size-bounded LRU cache of HTTP responses, keyed by URL.
+
+    Each entry is stored as up to three files named after the SHA-1 of the
+    URL: `<key>.json` (URL and validators), `<key>.body` (response body) and
+    `<key>.details` (pickled details extracted from the body).
+
+    Parameters
+    ----------
+    directory : str
+        Directory holding the cache files, created if missing.
+    max_bytes : int, default 256 MB
+        Total size of cached files above which least recently used entries
+        are evicted.
+    """
+    SUFFIXES = ('.json', '.body', '.details')
+
+    def __init__(self, directory, max_bytes=256 * 1024 ** 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._sizes = OrderedDict()
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+        self._evict()
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def _load_index(self):
+        """
+        Rebuild the LRU order from the modification times of the files.
+        """
+        entries = []
+        for fname in os.listdir(self.directory):
+            key, suffix = os.path.splitext(fname)
+            if suffix != '.json':
+                continue
+            size = 0
+            for s in self.SUFFIXES:
+                try:
+                    size += os.path.getsize(self._path(key, s))
+                except OSError:
+                    pass
+            entries.append((os.path.getmtime(self._path(key, '.json')),
+                            key, size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._total += size
+
+    def __len__(self):
+        return len(self._sizes)
+
+    @property
+    def size(self):
+        """
+        Total size in bytes of the cached files.
+        """
+        return self._total
+
+    def _touch(self, key):
+        self._sizes.move_to_end(key)
+        try:
+            os.utime(self._path(key, '.json'))
+        except OSError:
+            pass
+
+    def _resize(self, key):
+        size = 0
+        for s in self.SUFFIXES:
+            try:
+                size += os.path.getsize(self._path(key, s))
+            except OSError:
+                pass
+        self._total += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        self._sizes.move_to_end(key)
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._sizes) > 1:
+            key = next(iter(self._sizes))
+            logging.debug('Evicting {} from HTTP cache'.format(key))
+            self._remove_files(key)
+
+    def _remove_files(self, key):
+        for s in self.SUFFIXES:
+            try:
+                os.remove(self._path(key, s))
+            except OSError:
+                pass
+        self._total -= self._sizes.pop(key, 0)
+
+    def validators(self, url):
+        """
+        Return conditional request headers for url, or an empty dict if url
+        is not cached.
+        """
+        with self._lock:
+            key = self.key(url)
+            if key not in self._sizes:
+                return {}
+            try:
+                with open(self._path(key, '.json')) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                self._remove_files(key)
+                return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def get_body(self, url):
+        """
+        Return the cached body of url, or None if url is not cached.
+        """
+        with self._lock:
+            key = self.key(url)
+            if key not in self._sizes:
+                return None
+            try:
+                with open(self._path(key, '.body'), 'rb') as f:
+                    body = f.read()
+            except OSError:
+                self._remove_files(key)
+                return None
+            self._touch(key)
+            return body
+
+    def put(self, url, headers, body):
+        """
+        Store body of url if the response carries validators.
+
+        Any details stored for a previous version of the body are dropped.
+
+        Parameters
+        ----------
+        url : str
+            URL of the response.
+        headers : http.client.HTTPMessage
+            Response headers.
+        body : bytes
+            Decoded response body.
+        """
+        meta = {'url': url,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified')}
+        if not (meta['etag'] or meta['last_modified']):
+            return
+        with self._lock:
+            key = self.key(url)
+            try:
+                os.remove(self._path(key, '.details'))
+            except OSError:
+                pass
+            with open(self._path(key, '.body'), 'wb') as f:
+                f.write(body)
+            with open(self._path(key, '.json'), 'w') as f:
+                json.dump(meta, f)
+            self._resize(key)
+            self._evict()
+
+    def get_details(self, url):
+        """
+        Return details stored for the cached body of url, or None.
+        """
+        with self._lock:
+            key = self.key(url)
+            if key not in self._sizes:
+                return None
+            try:
+                with open(self._path(key, '.details'), 'rb') as f:
+                    return pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return None
+
+    def put_details(self, url, details):
+        """
+        Store details extracted from the cached body of url.
+        """
+        with self._lock:
+            key = self.key(url)
+            if key not in self._sizes:
+                return
+            with open(self._path(key, '.details'), 'wb') as f:
+                pickle.dump(details, f)
+            self._resize(key)
+            self._evict()
+
+    def invalidate(self, url):
+        """
+        Remove url from the cache.
+        """
+        with self._lock:
+            self._remove_files(self.key(url))
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+        """
+        with self._lock:
+            for key in list(self._sizes):
+                self._remove_files(key)
@@ -0,0 +1,111 @@
+"""
+Token-bucket rate limiting used to keep concurrent scraping polite.
+
+Each host gets its own bucket, so a slow or rate-limited host never holds
+back requests to other hosts.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket(object):
+    """
+    Classic token bucket: tokens refill continuously at `rate` per second up
+    to `burst`, and every request consumes one token.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second.
+    burst : int, default 1
+        Maximum number of tokens the bucket can hold.
+    """
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError('rate must be positive, got {}'.format(rate))
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def try_acquire(self):
+        """
+        Consume a token if one is available, without blocking.
+
+        Returns
+        -------
+        acquired : bool
+            True if a token was consumed.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def wait_time(self):
+        """
+        Return seconds until the next token becomes available.
+        """
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def acquire(self):
+        """
+        Block until a token is available and consume it.
+        """
+        while not self.try_acquire():
+            time.sleep(self.wait_time())
+
+
+class HostRateLimiter(object):
+    """
+    Keep one TokenBucket per host.
+
+    Parameters
+    ----------
+    rate : float
+        Requests per second allowed for each host.
+    burst : int, default 1
+        Number of requests a host may receive back-to-back.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url):
+        """
+        Return the host part of url, used as the bucket key.
+        """
+        return urlsplit(url).netloc.lower()
+
+    def bucket(self, host):
+        """
+        Return the bucket for host, creating it on first use.
+        """
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+    def try_acquire(self, host):
+        return self.bucket(host).try_acquire()
+
+    def wait_time(self, hosts):
+        """
+        Return seconds until any of hosts can be requested again.
+        """
+        return min((self.bucket(h).wait_time() for h in hosts), default=0.0)
@@ -1,4 +1,3 @@
-from bs4 import BeautifulSoup
 from basewebscraper import BaseWebScraper
 import logging
 
@@ -9,10 +8,34 @@ class ResistanceNearMeScraper(BaseWebScraper):
 
     Needs selenuim to load the webpage, so this class Implements its own
     scrape() method, overriding the scrape() method from
-    AbstractWebScraper.
+    AbstractWebScraper. The page is rendered in a headless Chrome that is
+    kept open between calls to scrape(); call close() (or use the scraper
+    as a context manager) to quit it.
+
+    The same events can be read without a browser from the Firebase JSON
+    feed behind the page, see scrape_feed().
     """
     _name = 'resistancenearme'
     _root_url = 'https://resistancenearme.org'
+    #  Firebase feed the page loads its events from
+    _feed_url = 'https://townhallproject-86312.firebaseio.com/townHalls.json'
+    #  seconds to wait for the page to load events after each action
+    _load_timeout = 30
+    #  seconds the number of event rows must stay unchanged to count as loaded
+    _settle_time = 0.5
+
+    def __init__(self, browser=None, **kwargs):
+        """
+        Parameters
+        ----------
+        browser : selenium.webdriver.remote.webdriver.WebDriver, default None
+            Browser used to render the website, if None a headless Chrome is
+            started on first use.
+        **kwargs
+            Passed to BaseWebScraper.
+        """
+        super().__init__(**kwargs)
+        self._browser = browser
 
     def get_event_urls(self):
         raise NotImplemented
@@ -89,64 +112,247 @@ class ResistanceNearMeScraper(BaseWebScraper):
                       'URL: {URL}\n'.format(**details))
         return details
 
-    def scrape(self):
+    def extract_record_details(self, record):
+        """
+        Extract details of an event given its record in the Firebase feed.
+        Fills the same fields as extract_details() does from the rendered
+        event row.
+
+        Parameters
+        ----------
+        record : dict
+            Event record from the feed.
+
+        Returns
+        -------
+        details : dict
+            Dictionary containing event-info.
+        """
+        details = dict()
+        details['SOURCE'] = 'resistancenearme.org'
+        details['NOTES'] = ('Parsed {} for training data'
+                            .format(self._root_url))
+        details['URL'] = '{}/event.html?eid={}'.format(self._root_url,
+                                                       record.get('eventId'))
+
+        details['ORGANIZER'] = record.get('Location')
+        details['LOCATION'] = record.get('address')
+        e_time = ', '.join(v for v in (record.get('Time'),
+                                       record.get('timeZone')) if v)
+        details['DATE_TIME'] = ' '.join(v for v in (record.get('Date'),
+                                                    e_time) if v)
+
+        #  the page titles member events "Member (Party) State, District"
+        event_name = record.get('eventName')
+        if not event_name and record.get('Member'):
+            event_name = '{} ({}) {}, {}'.format(record.get('Member'),
+                                                 record.get('Party'),
+                                                 record.get('State'),
+                                                 record.get('District'))
+        details['NAME'] = event_name or ''
+        details['TAGS'] = [record.get('meetingType') or '']
+        details['DESCRIPTION'] = (record.get('Notes') or
+                                  'There are no notes for this event.')
+
+        #  Missing info
+        details['TYPES'] = []
+        details['LOCATION_GMAPS'] = None
+        details['SOCIAL'] = []
+        return details
+
+    def scrape_feed(self, feed_url=None):
+        """
+        Scrape events from the Firebase JSON feed, without a browser.
+
+        Parameters
+        ----------
+        feed_url : str, default None
+            URL of the feed, if None `_feed_url` is used. Point it at
+            fixtureserver.py to scrape the saved fixture.
+
+        Returns
+        -------
+        event_df : pandas.core.frame.DataFrame
+            DataFrame object containing info for all events scraped.
+        """
+        import json
+        import pandas as pd
+        from events import EventRecords
+
+        feed_url = self._feed_url if feed_url is None else feed_url
+        feed = json.loads(self.get_page(feed_url).content.decode('utf-8'))
+        #  Firebase returns collections as objects keyed by record id
+        if isinstance(feed, dict):
+            feed = [dict(r, eventId=r.get('eventId', k))
+                    for k, r in feed.items() if isinstance(r, dict)]
+        records = EventRecords()
+        for record in feed or []:
+            details = self.extract_record_details(record)
+            details['LAST_UPDATED'] = pd.Timestamp('now')
+            records.append(details)
+        logging.info('Read {} events from {}'.format(len(records), feed_url))
+        return records.to_frame()
+
+    def get_browser(self):
+        """
+        Return the headless browser used to render the website.
+
+        The browser is started on first use and reused by later calls to
+        scrape() until close() is called.
+        """
+        if self._browser is None:
+            from selenium import webdriver
+            options = webdriver.ChromeOptions()
+            options.add_argument('--headless=new')
+            options.add_argument('--disable-gpu')
+            self._browser = webdriver.Chrome(options=options)
+            self._browser.set_window_size(1120, 550)
+        return self._browser
+
+    def close(self):
+        """
+        Quit the browser, if one was started.
+        """
+        if self._browser is not None:
+            self._browser.quit()
+            self._browser = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _wait_for_events(self, wait, old_rows=None):
+        """
+        Block until the event rows have loaded and return them.
+
+        The rows have loaded once their number stops changing for
+        `_settle_time` seconds; no rows at all is a valid result (e.g. a
+        filter matching no events). If old_rows, the rows shown before the
+        last action, are given, first wait until they are replaced (the
+        first one goes stale or their number changes); if they never are,
+        the action did not change the events and the old rows are kept.
+        """
+        import time
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+
+        def find_rows(driver):
+            return driver.find_elements(By.CLASS_NAME, 'event-row')
+
+        if old_rows:
+            old_stale = EC.staleness_of(old_rows[0])
+
+            def rows_changed(driver):
+                return (old_stale(driver) or
+                        len(find_rows(driver)) != len(old_rows))
+
+            try:
+                wait.until(rows_changed)
+            except TimeoutException:
+                logging.debug('Event rows unchanged, keeping {} rows'
+                              .format(len(old_rows)))
+        state = {'rows': None, 'since': None}
+
+        def rows_settled(driver):
+            rows = find_rows(driver)
+            now = time.monotonic()
+            if state['rows'] is None or len(rows) != len(state['rows']):
+                state['rows'], state['since'] = rows, now
+                return False
+            return now - state['since'] >= self._settle_time
+
+        wait.until(rows_settled)
+        return state['rows']
+
+    def scrape(self, timeout=None):
         """
         Scrape website for info on all events.
         Details are extracted into a DataFrame object.
 
+        Instead of sleeping for fixed intervals, each step waits until the
+        DOM shows the events have loaded: after each click the old event
+        rows are replaced and the number of rows has settled. A filter
+        showing no events is not an error.
+
+        Parameters
+        ----------
+        timeout : float, default None
+            Seconds to wait for each step before raising a
+            selenium.common.exceptions.TimeoutException, if None
+            `_load_timeout` is used.
+
         Returns
         -------
         event_df : pandas.core.frame.DataFrame
             DataFrame object containing info for all events scraped.
         """
-        from selenium import webdriver
-        import time
         import pandas as pd
         from tqdm import tqdm
-        browser = webdriver.PhantomJS()
-        browser.set_window_size(1120, 550)
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        from events import EventRecords
+
+        timeout = self._load_timeout if timeout is None else timeout
+        browser = self.get_browser()
         browser.get(self._root_url)
+        wait = WebDriverWait(browser, timeout, poll_frequency=0.2)
         # Allow the page to load completely
         # before we start locating elements in the DOM.
-        from selenium.webdriver.support.ui import WebDriverWait
-
-        def custom_condition(driver):
-            import time
-            time.sleep(7)
-            return True
+        wait.until(lambda d: d.execute_script('return document.readyState')
+                   == 'complete')
+        rows = self._wait_for_events(wait)
+        logging.debug('{} events loaded'.format(len(rows)))
 
-        WebDriverWait(browser, 10).until(custom_condition)
         # first need to click on dropdown-toggle to expand it
-        dropdowns = browser.find_elements_by_class_name("dropdown-toggle")
-        event_dd = dropdowns[3]
+        # (the fourth toggle holds the event type filters)
+        dropdowns = wait.until(
+            lambda d: d.find_elements(By.CLASS_NAME, 'dropdown-toggle')[3:])
+        event_dd = dropdowns[0]
         event_dd.click()
         # next click on every event category in dropdown
-        el = browser.find_elements_by_xpath('//a[@data-filter="meetingType"]')
+        filter_xpath = '//a[@data-filter="meetingType"]'
+        el = wait.until(EC.presence_of_all_elements_located((By.XPATH,
+                                                             filter_xpath)))
         for element in el:
-            time.sleep(3)
-            element.click()
-            time.sleep(3)
-            event_dd.click()
+            wait.until(EC.element_to_be_clickable(element)).click()
+            rows = self._wait_for_events(wait, old_rows=rows)
+            logging.debug('{} events after filter {}'.format(
+                len(rows), element.get_attribute('data-value')))
+            wait.until(EC.element_to_be_clickable(event_dd)).click()
         # create html parser from this webpage now that events are listed
-        s = BeautifulSoup(browser.page_source, 'html.parser')
+        s = self.make_soup(browser.page_source)
         # finds all events
         events = s.find_all(class_='event-row')
-        df = pd.DataFrame()
+        records = EventRecords()
         # for every event, append info to the proper list
         for event_soup in tqdm(events, desc='Parsing Events'):
             details = self.extract_details(event_soup)
             details['LAST_UPDATED'] = pd.Timestamp('now')
-            df = df.append(details, ignore_index=True)
+            records.append(details)
 
-        return df
+        return records.to_frame()
 
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--feed', nargs='?', const=True, default=None,
+                        help='read the Firebase feed (optionally at URL) '
+                             'instead of rendering the page')
+    args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
     #  init scraper
-    scraper = ResistanceNearMeScraper()
-    #  scrap and save current events
-    current_events_df = scraper.scrape()
+    with ResistanceNearMeScraper() as scraper:
+        #  scrap and save current events
+        if args.feed is None:
+            current_events_df = scraper.scrape()
+        else:
+            current_events_df = scraper.scrape_feed(
+                None if args.feed is True else args.feed)
     filename = scraper.save_csv(current_events_df)
     #  combine all events (for training?)
     all_events_df = scraper.combine_csv_files()
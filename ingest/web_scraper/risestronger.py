@@ -1,6 +1,32 @@
+import logging
+import re
 from basewebscraper import BaseWebScraper
 
 
+MONTHS_LIST = ['January', 'February', 'March', 'April',
+               'May', 'June', 'July', 'August',
+               'September', 'October', 'November', 'December']
+#  various representations of the month names
+MONTHS = frozenset(name
+                   for m in MONTHS_LIST
+                   for name in (m, m.upper(), m[:3], m[:3].upper()))
+#  subtitle line holding a month name as a space separated word
+DATE_LINE = re.compile(r'(?<![^ ])(?:{})(?![^ ])'.format(
+    '|'.join(sorted(MONTHS, key=len, reverse=True))))
+
+#  hrefs of event pages
+TAGS_HREF = re.compile(r'^/events\?tags')
+TYPES_HREF = re.compile(r'^/events\?types')
+MAPS_HREF = re.compile(r'^https://www\.google\.com/maps')
+FACEBOOK_HREF = re.compile('facebook.com/events')
+DISCLAIMER_CLASS = re.compile(' disclaimer')
+#  hrefs of listing pages
+EVENT_HREF = re.compile(r'^/events/')
+LIST_PAGE_HREF = re.compile(r'^/events/list\?page=')
+NON_EVENT_HREF = re.compile(r'^/events/map$|^/events/map\?page='
+                            r'|^/events/list\?page=|^/events/new$')
+
+
 class RiseStrongerScraper(BaseWebScraper):
     """
     Scrape RiseStronger event pages and parse event details
@@ -8,21 +34,9 @@ class RiseStrongerScraper(BaseWebScraper):
     """
     _name = 'risestronger'
     _root_url = 'https://risestronger.org'
-
-    def _get_months(self):
-        """
-        Return set of various representations of the month name.
-        """
-        MONTHS = set()
-        MONTHS_LIST = ['January', 'February', 'March', 'April',
-                       'May', 'June', 'July', 'August',
-                       'September', 'October', 'November', 'December']
-        for m in MONTHS_LIST:
-            MONTHS.add(m)
-            MONTHS.add(m.upper())
-            MONTHS.add(m[:3])
-            MONTHS.add(m[:3].upper())
-        return MONTHS
+    #  requests per second used for the listing pages in get_event_urls(),
+    #  which may all be in flight at once (up to `_max_workers`)
+    _list_rate_limit = 4.0
 
     def extract_details(self, soup):
         """
@@ -38,7 +52,6 @@ class RiseStrongerScraper(BaseWebScraper):
         details : dict
             Dictionary containing event-info.
         """
-        import re
         details = dict()
         details['SOURCE'] = 'risestronger.org'
         details['NOTES'] = 'Parsed www.risestronger.org for training data'
@@ -50,14 +63,13 @@ class RiseStrongerScraper(BaseWebScraper):
         # Tags
         event_tags = [a.get_text()
                       for a in soup.find_all(
-                          'a', href=re.compile('^/events\?tags'))]
+                          'a', href=TAGS_HREF)]
         event_types = [a.get_text()
                        for a in soup.find_all(
-                           'a', href=re.compile('^/events\?types'))]
+                           'a', href=TYPES_HREF)]
         event_location = None
         event_location_gmaps = None
-        map_link = soup.find('a',
-                             href=re.compile('^https://www\.google\.com/maps'))
+        map_link = soup.find('a', href=MAPS_HREF)
         if map_link is not None:
             event_location = map_link.get_text()
             event_location_gmaps = map_link['href']
@@ -71,16 +83,14 @@ class RiseStrongerScraper(BaseWebScraper):
                        for a in soup.find_all(
                            'a',
                            target='_blank',
-                           href=re.compile('facebook.com/events'))]
+                           href=FACEBOOK_HREF)]
         details['SOCIAL'] = event_links
 
         # Main Text
-        dis = soup.find('div', class_=re.compile(' disclaimer'))
+        dis = soup.find('div', class_=DISCLAIMER_CLASS)
         main_text = dis.parent.find('div', class_=True)
         assert(main_text is not None)
-        event_description = (main_text
-                             .get_text('\n', strip=True)
-                             .encode('utf-8'))
+        event_description = main_text.get_text('\n', strip=True)
         details['DESCRIPTION'] = event_description
 
         # Timing
@@ -101,7 +111,7 @@ class RiseStrongerScraper(BaseWebScraper):
             if len(subtitle_lines) == 0:
                 continue
             for line in subtitle_lines.split('\n'):
-                if not set(line.split(' ')).isdisjoint(self._get_months()):
+                if DATE_LINE.search(line):
                     event_date_time = line
                 elif line in event_types:
                     continue
@@ -134,42 +144,40 @@ class RiseStrongerScraper(BaseWebScraper):
     def get_event_urls(self):
         """
         Return URLs of event-pages on website.
-        """
-        import re
-
-        def _is_pattern(pattern):
-            return (lambda x: x and bool(re.compile(pattern).search(x)))
 
+        The number of listing pages is read from the first page, then all
+        listing pages are fetched concurrently, at `_list_rate_limit`
+        requests per second with a burst of one request per worker rather
+        than the slower limits used for event pages.
+        """
         def get_num_pages():
             soup = self.get_soup(self._root_url +
                                  '/events/list')
             num_pages = 1
-            for a in soup.find_all(href=_is_pattern('^/events/list\?page=')):
+            for a in soup.find_all(href=LIST_PAGE_HREF):
                 num_pages = max(num_pages,
                                 int(a['href'][len('/events/list?page='):]))
             return num_pages
 
-        def get_events_on_page(page_num):
-            page_url = '{}/events/list?page={:d}'.format(
-                self._root_url,
-                page_num)
-            soup = self.get_soup(page_url)
+        def get_events_on_page(soup):
             event_urls = []
-            filter_strings = ['^/events/map$',
-                              '^/events/map\?page=',
-                              '^/events/list\?page=',
-                              '^/events/new$']
-            is_non_event = _is_pattern('|'.join(filter_strings))
-            for a in soup.find_all(href=_is_pattern('^/events/')):
-                if is_non_event(a['href']):
+            for a in soup.find_all(href=EVENT_HREF):
+                if NON_EVENT_HREF.search(a['href']):
                     continue
                 event_urls.append(a['href'])
             return event_urls
 
         event_urls = []
         num_pages = get_num_pages()
-        for page_num in range(1, num_pages + 1):  # , desc='Finding Events'):
-            event_urls.extend(get_events_on_page(page_num))
+        page_urls = ['{}/events/list?page={:d}'.format(self._root_url, n)
+                     for n in range(1, num_pages + 1)]
+        pages = self.iter_soups(page_urls,
+                                rate=self._list_rate_limit,
+                                burst=min(num_pages, self._max_workers))
+        for page_url, soup in pages:
+            if soup is None:
+                continue
+            event_urls.extend(get_events_on_page(soup))
 
         #  append root url as prefix
         event_urls = [self._root_url + eu for eu in event_urls]
@@ -183,10 +191,9 @@ if __name__ == '__main__':
         - Save to CSV file
         - Find all previously saved CSV files and combine into single DataFrame
     """
-    import logging
     logging.basicConfig(level=logging.INFO)
     #  init scraper
-    scraper = RiseStrongerScraper()
+    scraper = RiseStrongerScraper(cache_dir='http_cache')
     #  scrap and save current events
     current_events_df = scraper.scrape()
     filename = scraper.save_csv(current_events_df)
@@ -0,0 +1,430 @@
+"""
+Full-text search over scraped events and ingested emails.
+
+The index is a local SQLite database: a `documents` table holding the latest
+version of every event (keyed by URL) and email (keyed by Message-ID), and an
+FTS5 table indexing their titles, tags, locations and texts. Queries are
+ranked with BM25 and can be narrowed down by kind, SOURCE (the sender of an
+email), TAGS and date range (the START of an event, see datetimes.py, or the
+date an email was sent), e.g. all actions mentioning healthcare in Ohio:
+
+    SearchIndex().search('healthcare ohio', kind='event')
+
+update() indexes the snapshots in `scraped_data/` and the mail log files
+written by scraper.MailLog in `../mail_data/` incrementally: snapshot files
+already indexed are skipped, and only the records appended to a mail log file
+since the last update are read.
+
+Typical Usage:
+    python searchindex.py update
+    python searchindex.py search healthcare ohio --kind event
+    python searchindex.py search town hall --source risestronger.org \\
+        --since 2017-05-01 --until 2017-06-01
+"""
+from collections import namedtuple
+import argparse
+import datetime
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRAPED_DATA = os.path.join(HERE, 'scraped_data')
+MAIL_DATA = os.path.join(os.path.dirname(HERE), 'mail_data')
+DEFAULT_PATH = os.path.join(SCRAPED_DATA, 'search.db')
+#  dates are stored as text in this format, so they sort chronologically
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+#  weights of the indexed columns in the BM25 rank
+WEIGHTS = {'title': 4.0, 'tags': 2.0, 'location': 2.0, 'body': 1.0}
+#  'emails_<timestamp>.jsonl.gz' files written by scraper.MailLog
+MAIL_LOG_NAME = re.compile(r'^emails_.*\.jsonl\.gz$')
+
+#  a search result, see SearchIndex.search()
+Hit = namedtuple('Hit', ['kind', 'key', 'source', 'title', 'date', 'score',
+                         'snippet'])
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL UNIQUE,
+    source TEXT,
+    title TEXT,
+    tags TEXT,
+    location TEXT,
+    body TEXT,
+    date TEXT,
+    updated TEXT);
+CREATE INDEX IF NOT EXISTS documents_source ON documents (kind, source);
+CREATE INDEX IF NOT EXISTS documents_date ON documents (date);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    title, tags, location, body,
+    content='documents', content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS documents_insert AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, title, tags, location, body)
+    VALUES (new.id, new.title, new.tags, new.location, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_delete AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, tags, location,
+                               body)
+    VALUES ('delete', old.id, old.title, old.tags, old.location, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_update AFTER UPDATE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, tags, location,
+                               body)
+    VALUES ('delete', old.id, old.title, old.tags, old.location, old.body);
+    INSERT INTO documents_fts (rowid, title, tags, location, body)
+    VALUES (new.id, new.title, new.tags, new.location, new.body);
+END;
+CREATE TABLE IF NOT EXISTS indexed_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER,
+    records INTEGER);
+'''
+_COLUMNS = ('kind', 'key', 'source', 'title', 'tags', 'location', 'body',
+            'date', 'updated')
+
+
+def match_query(text):
+    """
+    Return an FTS5 query matching the documents holding every word of text.
+    """
+    return ' '.join('"{}"'.format(w) for w in re.findall(r'\w+', text))
+
+
+def _format_date(value):
+    """
+    Return a date (str, datetime or Timestamp) as text in DATE_FORMAT, in
+    UTC if it has a time zone, or None.
+    """
+    if value is None or value != value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value.strip())
+        except ValueError:
+            import pandas as pd
+            try:
+                value = pd.Timestamp(value)
+            except (ValueError, TypeError):
+                return None
+            if value is pd.NaT:
+                return None
+    if getattr(value, 'tzinfo', None) is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value.strftime(DATE_FORMAT)
+
+
+def snapshot_paths(directory=SCRAPED_DATA):
+    """
+    Return the full and delta snapshots in directory, listing a Parquet file
+    instead of a CSV file with the same name.
+    """
+    from snapshots import SNAPSHOT_NAME
+    found = dict()
+    for fname in sorted(os.listdir(directory)):
+        if SNAPSHOT_NAME.match(fname) is None:
+            continue
+        stem = os.path.splitext(fname)[0]
+        if stem in found and not fname.lower().endswith('.parquet'):
+            continue
+        found[stem] = os.path.join(directory, fname)
+    return sorted(found.values())
+
+
+def read_mail_log(fname, skip=0):
+    """
+    Yield the records of a mail log file after the first skip ones, up to
+    its last complete record.
+    """
+    try:
+        with gzip.open(fname, 'rt', encoding='utf-8') as f:
+            for n, line in enumerate(f):
+                if n < skip:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logging.warning('Skipping corrupt record in '
+                                    '{}'.format(fname))
+                    yield None
+    except (EOFError, OSError) as e:
+        logging.warning('Stopped reading {}: {}'.format(fname, e))
+
+
+class SearchIndex(object):
+    """
+    SQLite FTS5 index of events and emails.
+
+    Parameters
+    ----------
+    path : str, default DEFAULT_PATH
+        Path of the SQLite database, created if missing. ':memory:' keeps
+        the index in memory.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def _upsert(self, rows):
+        """
+        Insert documents, replacing indexed documents with the same key if
+        the new version was updated later.
+        """
+        updates = ', '.join('{0} = excluded.{0}'.format(c)
+                            for c in _COLUMNS if c != 'key')
+        sql = ('INSERT INTO documents ({}) VALUES ({}) '
+               'ON CONFLICT (key) DO UPDATE SET {} '
+               'WHERE documents.updated IS NULL '
+               'OR excluded.updated > documents.updated'
+               .format(', '.join(_COLUMNS), ', '.join('?' * len(_COLUMNS)),
+                       updates))
+        with self.conn:
+            return self.conn.executemany(sql, rows).rowcount
+
+    def add_events(self, events_df):
+        """
+        Index events, replacing indexed events with the same URL if the new
+        version has a later LAST_UPDATED. Rows without a URL are skipped.
+
+        Returns
+        -------
+        num_rows : int
+            Number of events inserted or updated.
+        """
+        from datetimes import parse_date_times
+        from snapshots import as_list, as_text, normalize_events
+
+        df = normalize_events(events_df)
+        df = df.loc[df['URL'].notna()]
+        if 'DATE_TIME' in df.columns:
+            starts = parse_date_times(
+                df['DATE_TIME'],
+                df['SOURCE'] if 'SOURCE' in df.columns else None)['START']
+        else:
+            starts = [None] * len(df)
+        rows = []
+        for event, start in zip(df.to_dict('records'), starts):
+            rows.append((
+                'event', event['URL'], as_text(event.get('SOURCE')),
+                as_text(event.get('NAME')),
+                json.dumps(as_list(event.get('TAGS')) +
+                           as_list(event.get('TYPES'))),
+                as_text(event.get('LOCATION')),
+                as_text(event.get('DESCRIPTION')),
+                _format_date(start), _format_date(event.get('LAST_UPDATED'))))
+        return self._upsert(rows)
+
+    def add_emails(self, records):
+        """
+        Index email records written by scraper.MailLog. Records already
+        indexed are skipped.
+
+        Returns
+        -------
+        num_rows : int
+            Number of emails inserted.
+        """
+        rows = []
+        for record in records:
+            if not record or not record.get('message_id'):
+                continue
+            date = _format_date(record.get('date'))
+            rows.append(('email', record['message_id'], record.get('sender'),
+                         record.get('subject'), None, None,
+                         record.get('text'), date, date))
+        return self._upsert(rows)
+
+    def _indexed(self, path):
+        """
+        Return (size, mtime, records) of path when it was last indexed, or
+        None.
+        """
+        return self.conn.execute(
+            'SELECT size, mtime, records FROM indexed_files WHERE path = ?',
+            (path,)).fetchone()
+
+    def _mark_indexed(self, path, records):
+        stat = os.stat(path)
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO indexed_files VALUES (?, ?, ?, ?)',
+                (path, stat.st_size, stat.st_mtime_ns, records))
+
+    def update(self, directory=SCRAPED_DATA, mail_directory=MAIL_DATA):
+        """
+        Index the snapshots in directory and the mail logs in mail_directory
+        that are new or changed since the last update.
+
+        Returns
+        -------
+        num_rows : int
+            Number of documents inserted or updated.
+        """
+        from snapshots import event_rows, read_snapshot
+
+        num_rows = 0
+        for path in snapshot_paths(directory):
+            stat = os.stat(path)
+            if self._indexed(path) == (stat.st_size, stat.st_mtime_ns, None):
+                continue
+            logging.info('Indexing {}'.format(path))
+            num_rows += self.add_events(event_rows(read_snapshot(path)))
+            self._mark_indexed(path, None)
+
+        if os.path.isdir(mail_directory):
+            for fname in sorted(os.listdir(mail_directory)):
+                if MAIL_LOG_NAME.match(fname) is None:
+                    continue
+                path = os.path.join(mail_directory, fname)
+                stat = os.stat(path)
+                indexed = self._indexed(path)
+                if indexed is not None and \
+                        indexed[:2] == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                skip = indexed[2] if indexed is not None else 0
+                records = list(read_mail_log(path, skip))
+                logging.info('Indexing {} emails of {}'.format(len(records),
+                                                               path))
+                num_rows += self.add_emails(records)
+                self._mark_indexed(path, skip + len(records))
+        logging.info('Indexed {} documents into {}'.format(num_rows,
+                                                           self.path))
+        return num_rows
+
+    def search(self, query=None, kind=None, source=None, tags=None,
+               since=None, until=None, limit=20, raw=False):
+        """
+        Search the index.
+
+        Parameters
+        ----------
+        query : str, default None
+            Words that must all appear in a document (case-insensitive and
+            stemmed). If None the documents matching the other filters are
+            returned, latest first.
+        kind : str, default None
+            'event' or 'email', if None both are searched.
+        source : str or list, default None
+            Only return documents from these SOURCEs (or email senders).
+        tags : str or list, default None
+            Only return events with all these TAGS or TYPES.
+        since, until : str or Timestamp, default None
+            Only return documents dated in [since, until).
+        limit : int, default 20
+            Maximum number of results.
+        raw : bool, default False
+            If True query is passed to FTS5 as is, so it may use its query
+            syntax (OR, NOT, "phrases", prefix*, title: ...).
+
+        Returns
+        -------
+        hits : list
+            Hits, best match first. score is the BM25 rank (lower is
+            better) and snippet the matching part of the text.
+        """
+        where, params = [], []
+        if kind is not None:
+            where.append('d.kind = ?')
+            params.append(kind)
+        if source is not None:
+            sources = [source] if isinstance(source, str) else list(source)
+            where.append('d.source IN ({})'.format(
+                ', '.join('?' * len(sources))))
+            params.extend(sources)
+        if tags is not None:
+            for tag in [tags] if isinstance(tags, str) else tags:
+                where.append('EXISTS (SELECT 1 FROM json_each(d.tags) '
+                             'WHERE lower(json_each.value) = ?)')
+                params.append(tag.lower())
+        if since is not None:
+            where.append('d.date >= ?')
+            params.append(_format_date(since))
+        if until is not None:
+            where.append('d.date < ?')
+            params.append(_format_date(until))
+
+        columns = 'd.kind, d.key, d.source, d.title, d.date'
+        if query:
+            where.insert(0, 'documents_fts MATCH ?')
+            params.insert(0, query if raw else match_query(query))
+            sql = ('SELECT {}, bm25(documents_fts, {}), '
+                   "snippet(documents_fts, 3, '[', ']', '...', 16) "
+                   'FROM documents_fts '
+                   'CROSS JOIN documents d ON d.id = documents_fts.rowid '
+                   'WHERE {} ORDER BY 6 LIMIT ?'
+                   .format(columns, ', '.join(str(w) for w in
+                                              WEIGHTS.values()),
+                           ' AND '.join(where)))
+        else:
+            sql = ('SELECT {}, NULL, substr(d.body, 1, 120) '
+                   'FROM documents d {} ORDER BY d.date DESC LIMIT ?'
+                   .format(columns,
+                           'WHERE ' + ' AND '.join(where) if where else ''))
+        params.append(limit)
+        return [Hit(*row) for row in self.conn.execute(sql, params)]
+
+
+if __name__ == '__main__':
+    import time
+
+    parser = argparse.ArgumentParser(
+        description='Search scraped events and ingested emails.')
+    parser.add_argument('--index', default=DEFAULT_PATH)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    p = commands.add_parser('update', help='index new snapshots and emails')
+    p.add_argument('--directory', default=SCRAPED_DATA)
+    p.add_argument('--mail-directory', default=MAIL_DATA)
+
+    p = commands.add_parser('search', help='search the index')
+    p.add_argument('words', nargs='*')
+    p.add_argument('--kind', choices=['event', 'email'])
+    p.add_argument('--source', action='append')
+    p.add_argument('--tag', action='append')
+    p.add_argument('--since')
+    p.add_argument('--until')
+    p.add_argument('-n', '--limit', type=int, default=20)
+    p.add_argument('--raw', action='store_true',
+                   help='use FTS5 query syntax')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    with SearchIndex(args.index) as index:
+        if args.command == 'update':
+            index.update(args.directory, args.mail_directory)
+            print('{} holds {} documents'.format(args.index, len(index)))
+        else:
+            start = time.perf_counter()
+            hits = index.search(' '.join(args.words) or None, args.kind,
+                                args.source, args.tag, args.since,
+                                args.until, args.limit, args.raw)
+            elapsed = time.perf_counter() - start
+            for hit in hits:
+                print('{} {:<5} {:<20} {}\n    {}\n    {}'.format(
+                    (hit.date or '')[:10].ljust(10), hit.kind,
+                    str(hit.source)[:20], hit.title, hit.key,
+                    ' '.join((hit.snippet or '').split())))
+            print('{} results in {:.1f} ms'.format(len(hits), 1e3 * elapsed))
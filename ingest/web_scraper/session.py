@@ -0,0 +1,274 @@
+"""
+Pooled HTTP session used by the web scrapers.
+
+Connections are kept alive and reused per host, responses are requested
+compressed (gzip/deflate, and brotli if the `brotli` package is installed)
+and transparently decoded, and failed requests are retried with exponential
+backoff. Errors are raised as urllib.error.HTTPError/URLError so callers can
+handle them the same way as urllib.request.urlopen.
+
+If the session is given an HTTPCache, requests for cached URLs are sent as
+conditional GETs and a 304 Not Modified answer is served from the cache.
+"""
+from urllib.parse import urlsplit, urljoin
+import http.client
+import logging
+import ssl
+import threading
+import time
+import urllib.error
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Response(object):
+    """
+    Response to a GET request.
+
+    Attributes
+    ----------
+    url : str
+        Final URL, after following redirects.
+    status : int
+        HTTP status code.
+    headers : http.client.HTTPMessage
+        Response headers.
+    content : bytes
+        Decoded response body.
+    not_modified : bool
+        True if the server answered 304 Not Modified and content was read
+        from the cache.
+    """
+    def __init__(self, url, status, headers, content, not_modified=False):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.not_modified = not_modified
+
+    def __repr__(self):
+        return '<Response [{}] {}>'.format(self.status, self.url)
+
+
+class HTTPSession(object):
+    """
+    Thread-safe HTTP client with per-host keep-alive connection pools.
+
+    Parameters
+    ----------
+    headers : dict, default None
+        Headers sent with every request, merged over DEFAULT_HEADERS.
+    timeout : float, default 30
+        Socket timeout in seconds for connecting and reading.
+    retries : int, default 3
+        Number of times a request is retried after a connection error or a
+        retryable status (429, 5xx).
+    backoff : float, default 0.5
+        Base delay in seconds; retry i sleeps backoff * 2**i, or the
+        server's Retry-After if given.
+    pool_size : int, default 4
+        Maximum number of idle connections kept per host.
+    max_redirects : int, default 5
+        Maximum number of redirects followed per request.
+    cache : HTTPCache, default None
+        Cache used for conditional requests, if None nothing is cached.
+    """
+    DEFAULT_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',  #NOQA
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',  #NOQA
+        'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
+        'Accept-Encoding': 'gzip, deflate' + (', br' if brotli else ''),
+        'Accept-Language': 'en-US,en;q=0.8',
+        'Connection': 'keep-alive'}
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    def __init__(self, headers=None, timeout=30, retries=3, backoff=0.5,
+                 pool_size=4, max_redirects=5, cache=None):
+        self.headers = dict(self.DEFAULT_HEADERS)
+        self.headers.update(headers or {})
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.max_redirects = max_redirects
+        self.cache = cache
+        self._pools = dict()
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            pools, self._pools = self._pools, dict()
+        for pool in pools.values():
+            for conn in pool:
+                conn.close()
+
+    def _get_connection(self, key):
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool:
+                return pool.pop()
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port,
+                                               timeout=self.timeout,
+                                               context=self._ssl_context)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _release_connection(self, key, conn):
+        with self._lock:
+            pool = self._pools.setdefault(key, [])
+            if len(pool) < self.pool_size:
+                pool.append(conn)
+                return
+        conn.close()
+
+    @staticmethod
+    def _decode(body, encoding):
+        encoding = (encoding or 'identity').strip().lower()
+        if encoding in ('identity', ''):
+            return body
+        if encoding in ('gzip', 'x-gzip'):
+            return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        if encoding == 'deflate':
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                #  some servers send raw deflate without zlib header
+                return zlib.decompress(body, -zlib.MAX_WBITS)
+        if encoding == 'br' and brotli is not None:
+            return brotli.decompress(body)
+        raise ValueError('Unsupported Content-Encoding {}'.format(encoding))
+
+    def _request_once(self, url, headers):
+        """
+        Send a single GET request and read the full response.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise urllib.error.URLError(
+                'unknown url type: {}'.format(parts.scheme))
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        conn = self._get_connection(key)
+        try:
+            conn.request('GET', path, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+        except Exception:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release_connection(key, conn)
+        return resp, body
+
+    def _retry_delay(self, attempt, resp=None):
+        if resp is not None:
+            retry_after = resp.getheader('Retry-After')
+            if retry_after and retry_after.strip().isdigit():
+                return float(retry_after)
+        return self.backoff * 2 ** attempt
+
+    def get(self, url, headers=None, refresh=False):
+        """
+        GET url, following redirects and retrying transient failures.
+
+        Parameters
+        ----------
+        url : str
+            URL to fetch.
+        headers : dict, default None
+            Extra headers for this request.
+        refresh : bool, default False
+            If True the request is sent unconditionally, ignoring the cache.
+
+        Returns
+        -------
+        response : Response
+            Response with decoded content.
+
+        Raises
+        ------
+        urllib.error.HTTPError
+            If the final response is not successful.
+        urllib.error.URLError
+            If the server could not be reached after all retries.
+        """
+        use_cache = self.cache is not None and not refresh
+
+        redirects = 0
+        attempt = 0
+        while True:
+            _headers = dict(self.headers)
+            if use_cache:
+                _headers.update(self.cache.validators(url))
+            _headers.update(headers or {})
+            try:
+                resp, body = self._request_once(url, _headers)
+            except (http.client.HTTPException, OSError) as e:
+                if isinstance(e, urllib.error.URLError):
+                    raise
+                if attempt >= self.retries:
+                    raise urllib.error.URLError(e)
+                delay = self._retry_delay(attempt)
+                logging.debug('Retrying {} in {:.1f}s after {!r}'.format(
+                    url, delay, e))
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            if resp.status in self.RETRY_STATUSES and attempt < self.retries:
+                delay = self._retry_delay(attempt, resp)
+                logging.debug('Retrying {} in {:.1f}s after status {}'.format(
+                    url, delay, resp.status))
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            location = resp.getheader('Location')
+            if resp.status in self.REDIRECT_STATUSES and location:
+                if redirects >= self.max_redirects:
+                    raise urllib.error.HTTPError(
+                        url, resp.status, 'Too many redirects',
+                        resp.headers, None)
+                url = urljoin(url, location)
+                redirects += 1
+                attempt = 0
+                continue
+
+            break
+
+        if resp.status == 304 and use_cache:
+            content = self.cache.get_body(url)
+            if content is not None:
+                return Response(url, resp.status, resp.headers, content,
+                                not_modified=True)
+            #  entry vanished since the validators were read
+            return self.get(url, headers=headers, refresh=True)
+
+        if not 200 <= resp.status < 300:
+            raise urllib.error.HTTPError(url, resp.status, resp.reason,
+                                         resp.headers, None)
+        content = self._decode(body, resp.getheader('Content-Encoding'))
+        if self.cache is not None:
+            self.cache.put(url, resp.headers, content)
+        return Response(url, resp.status, resp.headers, content)
@@ -0,0 +1,517 @@
+"""
+Typed, columnar storage of scraped event snapshots.
+
+CSV snapshots store TAGS, TYPES and SOCIAL as Python list reprs, and some
+DESCRIPTIONs as bytes reprs (b'...'). normalize_events() turns these back
+into real lists and text, and LAST_UPDATED into timestamps. Snapshots are
+written as compressed Parquet files with list and timestamp columns, so a
+reader can load only the columns it needs (e.g. NAME, DATE_TIME and URL
+without any DESCRIPTION).
+
+Parquet support needs the `pyarrow` package.
+
+merge_snapshots() combines any number of snapshots into the latest version
+of every event while holding only one chunk of rows, plus a URL index, in
+memory at a time.
+
+Besides full snapshots (`<name>_events_<timestamp>`), a run can be saved as a
+delta snapshot (`<name>_delta_<timestamp>`) holding only the events added,
+changed or removed since the previous run, as told by CONTENT_HASH (see
+diff_events()). snapshot_at() rebuilds the view of a scraper at any point in
+time from the latest full snapshot and the deltas saved after it.
+
+Typical Usage:
+    python snapshots.py                     # convert scraped_data/*.csv
+    python snapshots.py --remove-csv        # ... and delete the CSVs
+"""
+import argparse
+import logging
+import os
+import re
+from events import (EVENT_COLUMNS, LIST_COLUMNS, add_content_hash, as_list,
+                    as_text, parse_timestamps)
+
+
+SCRAPED_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'scraped_data')
+#  columns holding timestamps
+TIMESTAMP_COLUMNS = ('LAST_UPDATED',)
+#  column of delta snapshots telling how each event changed
+CHANGE_COLUMN = 'CHANGE'
+CHANGES = ('added', 'changed', 'removed')
+#  '<name>_<kind>_<timestamp>.<ext>' names of snapshots saved by scrapers
+SNAPSHOT_NAME = re.compile(
+    r'^(?P<name>.+)_(?P<kind>events|delta)_(?P<timestamp>\d{8}T\d{6})'
+    r'\.(?P<ext>csv|parquet)$', re.IGNORECASE)
+
+
+def normalize_events(events_df):
+    """
+    Return a copy of events_df with typed columns.
+
+    List columns hold lists of strings, LAST_UPDATED holds timestamps and
+    all other columns hold strings (or None).
+
+    Parameters
+    ----------
+    events_df : DataFrame
+        Events as scraped or as read from a CSV snapshot.
+
+    Returns
+    -------
+    events_df : DataFrame
+        Normalized copy of events_df.
+    """
+    import pandas as pd
+    df = events_df.copy()
+    for c in df.columns:
+        if c in LIST_COLUMNS:
+            df[c] = [as_list(v) for v in df[c]]
+        elif c in TIMESTAMP_COLUMNS:
+            df[c] = parse_timestamps(df[c])
+        elif df[c].dtype == object or pd.api.types.is_string_dtype(df[c]):
+            df[c] = pd.Series([as_text(v) for v in df[c]], index=df.index,
+                              dtype=object)
+    return df
+
+
+def write_parquet(events_df, filename, compression='zstd'):
+    """
+    Write events_df to a Parquet file with typed list and timestamp columns.
+
+    Parameters
+    ----------
+    events_df : DataFrame
+        Events to write, normalized with normalize_events() first.
+    filename : str
+        Path of the Parquet file.
+    compression : str, default 'zstd'
+        Parquet compression codec.
+    """
+    import pyarrow.parquet as pq
+    pq.write_table(_to_table(normalize_events(events_df)), filename,
+                   compression=compression)
+
+
+def _to_table(df):
+    """
+    Convert normalized events into a pyarrow Table with typed columns.
+    """
+    import pyarrow as pa
+    arrays = []
+    for c in df.columns:
+        if c in LIST_COLUMNS:
+            arrays.append(pa.array(df[c].tolist(), type=pa.list_(pa.string())))
+        elif c in TIMESTAMP_COLUMNS:
+            arrays.append(pa.array(df[c], type=pa.timestamp('us')))
+        else:
+            arrays.append(pa.array([as_text(v) for v in df[c]],
+                                   type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+
+def read_snapshot(filename, columns=None):
+    """
+    Read a CSV or Parquet snapshot into a typed DataFrame.
+
+    Parameters
+    ----------
+    filename : str
+        Path of a .csv or .parquet snapshot.
+    columns : list, default None
+        Columns to read, if None all columns are read. Parquet files only
+        read the requested columns from disk.
+
+    Returns
+    -------
+    events_df : DataFrame
+        Normalized events.
+    """
+    import pandas as pd
+    if filename.lower().endswith('.parquet'):
+        df = pd.read_parquet(filename, columns=columns)
+        for c in df.columns:
+            if c in LIST_COLUMNS:
+                df[c] = [as_list(v) for v in df[c]]
+        return df
+    df = pd.read_csv(filename, usecols=columns)
+    return normalize_events(df)
+
+
+def snapshot_columns(filename):
+    """
+    Return the column names of a snapshot without reading its rows.
+    """
+    import pandas as pd
+    if filename.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(filename).names)
+    return list(pd.read_csv(filename, nrows=0).columns)
+
+
+def event_rows(events_df):
+    """
+    Return the events of a snapshot, dropping the removals and the CHANGE
+    column of a delta snapshot. Full snapshots are returned as they are.
+    """
+    if CHANGE_COLUMN not in events_df.columns:
+        return events_df
+    removed = (events_df[CHANGE_COLUMN] == 'removed').to_numpy()
+    return events_df.loc[~removed].drop(columns=CHANGE_COLUMN) \
+        .reset_index(drop=True)
+
+
+def diff_events(previous_df, current_df, removals=True, timestamp=None):
+    """
+    Return the delta from previous_df to current_df.
+
+    Events are matched by URL and compared by CONTENT_HASH, so an event whose
+    content did not change is left out even if it was scraped again. Events
+    without a URL cannot be matched and are always added.
+
+    Parameters
+    ----------
+    previous_df : DataFrame
+        Previous view of the events, e.g. the output of snapshot_at().
+    current_df : DataFrame
+        Events of the current run.
+    removals : bool, default True
+        If True, events of previous_df missing from current_df are recorded
+        as removed. Set to False when current_df only holds part of the
+        events, e.g. after an incremental scrape.
+    timestamp : str or Timestamp, default None
+        LAST_UPDATED of the removals, if None the current time is used.
+
+    Returns
+    -------
+    delta_df : DataFrame
+        Added and changed events of current_df, followed by removals carrying
+        only URL, SOURCE and LAST_UPDATED, with a CHANGE column telling
+        which is which.
+    """
+    import pandas as pd
+    previous = add_content_hash(event_rows(previous_df))
+    current = add_content_hash(current_df)
+    previous = previous.loc[previous['URL'].notna()]
+    previous_hashes = dict(zip(previous['URL'], previous['CONTENT_HASH']))
+
+    known = current['URL'].map(previous_hashes)
+    delta = current.copy()
+    delta[CHANGE_COLUMN] = ['added' if h != h or h is None else 'changed'
+                            for h in known]
+    delta = delta.loc[(known != current['CONTENT_HASH']).to_numpy()]
+
+    if removals:
+        gone = previous.loc[~previous['URL'].isin(current['URL'])]
+        if len(gone):
+            removed = pd.DataFrame({
+                'URL': gone['URL'].to_numpy(),
+                'SOURCE': gone['SOURCE'].to_numpy()
+                if 'SOURCE' in gone.columns else None,
+                'LAST_UPDATED': pd.Timestamp(timestamp or 'now'),
+                CHANGE_COLUMN: 'removed'})
+            delta = pd.concat([delta, removed], ignore_index=True)
+    logging.debug('Delta holds {}'.format(
+        delta[CHANGE_COLUMN].value_counts().to_dict()))
+    return delta.reset_index(drop=True)
+
+
+def apply_delta(events_df, delta_df):
+    """
+    Return events_df updated with delta_df, as returned by diff_events().
+
+    Removed and changed events are dropped from events_df, then added and
+    changed events are appended.
+    """
+    import pandas as pd
+    urls = delta_df['URL'].dropna()
+    kept = events_df.loc[~events_df['URL'].isin(urls).to_numpy()]
+    rows = event_rows(delta_df)
+    if not len(rows):
+        return kept.reset_index(drop=True)
+    if not len(kept):
+        return rows
+    return pd.concat([kept, rows], ignore_index=True)
+
+
+def snapshot_files(name, directory=SCRAPED_DATA):
+    """
+    Return the full and delta snapshots saved by scraper name in directory.
+
+    Returns
+    -------
+    snapshots : list
+        (timestamp, kind, path) tuples sorted by timestamp, where kind is
+        'events' for full snapshots and 'delta' for delta snapshots. A
+        Parquet file is listed instead of a CSV file with the same name.
+    """
+    import pandas as pd
+    found = dict()
+    for fname in os.listdir(directory):
+        match = SNAPSHOT_NAME.match(fname)
+        if match is None or match.group('name') != name:
+            continue
+        stem = os.path.splitext(fname)[0]
+        if stem in found and not fname.lower().endswith('.parquet'):
+            continue
+        found[stem] = (pd.Timestamp(match.group('timestamp')),
+                       match.group('kind').lower(),
+                       os.path.join(directory, fname))
+    return sorted(found.values())
+
+
+def snapshot_at(name, at=None, directory=SCRAPED_DATA, columns=None):
+    """
+    Rebuild the events scraped by scraper name as they were at a point in
+    time.
+
+    The latest full snapshot saved at or before `at` is read and the delta
+    snapshots saved after it, up to `at`, are applied in order.
+
+    Parameters
+    ----------
+    name : str
+        `_name` of the scraper, e.g. 'risestronger'.
+    at : str or Timestamp, default None
+        Point in time of the view, if None the latest view is returned.
+    directory : str, default SCRAPED_DATA
+        Directory of the snapshots.
+    columns : list, default None
+        Columns to return, if None all columns are returned.
+
+    Returns
+    -------
+    events_df : DataFrame
+        Normalized events, or None if no full snapshot was saved by `at`.
+    """
+    import pandas as pd
+    snapshots = snapshot_files(name, directory)
+    if at is not None:
+        at = pd.Timestamp(at)
+        snapshots = [s for s in snapshots if s[0] <= at]
+    bases = [i for i, s in enumerate(snapshots) if s[1] == 'events']
+    if not bases:
+        return None
+    _, _, path = snapshots[bases[-1]]
+    logging.debug('Reading base snapshot {}'.format(path))
+    events_df = read_snapshot(path)
+    for _, _, path in snapshots[bases[-1] + 1:]:
+        logging.debug('Applying delta snapshot {}'.format(path))
+        events_df = apply_delta(events_df, read_snapshot(path))
+    if columns is not None:
+        events_df = events_df.reindex(columns=list(columns))
+    return events_df
+
+
+def iter_snapshot_chunks(filename, chunksize=100000, columns=None):
+    """
+    Read a CSV or Parquet snapshot in chunks of normalized rows.
+
+    Parameters
+    ----------
+    filename : str
+        Path of a .csv or .parquet snapshot.
+    chunksize : int, default 100000
+        Maximum number of rows per chunk.
+    columns : list, default None
+        Columns to read, if None all columns are read.
+
+    Yields
+    ------
+    events_df : DataFrame
+        Normalized events.
+    """
+    import pandas as pd
+    if filename.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(filename).iter_batches(batch_size=chunksize,
+                                                        columns=columns)
+        for batch in batches:
+            df = batch.to_pandas()
+            for c in df.columns:
+                if c in LIST_COLUMNS:
+                    df[c] = [as_list(v) for v in df[c]]
+            yield df
+        return
+    for df in pd.read_csv(filename, usecols=columns, chunksize=chunksize):
+        yield normalize_events(df)
+
+
+def merge_snapshots(files, output, chunksize=100000, columns=None):
+    """
+    Merge snapshots into the latest version of each event and write it to
+    output, without loading the full history into memory.
+
+    The files are read twice in chunks. The first pass only reads URL and
+    LAST_UPDATED (and the CHANGE of delta snapshots, whose removals are
+    skipped) and keeps, for every URL, the latest timestamp and the
+    location (file, row) of the rows carrying it. The second pass copies
+    those rows to output. Memory therefore grows with the number of distinct
+    URLs, not with the number of snapshots. The rows kept are the same as
+    with events.latest_per_url() on the concatenated files.
+
+    Parameters
+    ----------
+    files : list
+        Paths of CSV or Parquet snapshots, oldest first.
+    output : str
+        Path of the merged snapshot; written as Parquet if it ends with
+        '.parquet', as CSV otherwise.
+    chunksize : int, default 100000
+        Number of rows read at a time.
+    columns : list, default None
+        Columns to write, if None all columns found in files are written.
+        URL and LAST_UPDATED are always written.
+
+    Returns
+    -------
+    num_rows : int
+        Number of events written.
+    """
+    import numpy as np
+    import pandas as pd
+
+    #  first pass: URL -> (latest timestamp, locations of its rows)
+    latest = dict()
+    keep = []
+    found = []
+    for fi, f in enumerate(files):
+        logging.debug('Indexing snapshot {}'.format(f))
+        file_columns = snapshot_columns(f)
+        found.extend(c for c in file_columns
+                     if c not in found and c != CHANGE_COLUMN)
+        index_columns = ['URL', 'LAST_UPDATED'] + \
+            [c for c in file_columns if c == CHANGE_COLUMN]
+        row = 0
+        for chunk in iter_snapshot_chunks(f, chunksize, index_columns):
+            stamps = parse_timestamps(chunk['LAST_UPDATED']).to_numpy()
+            removed = (chunk[CHANGE_COLUMN] == 'removed').to_numpy() \
+                if CHANGE_COLUMN in chunk.columns else np.zeros(len(chunk),
+                                                                bool)
+            for url, ts, gone in zip(chunk['URL'].tolist(), stamps, removed):
+                loc = (fi, row)
+                row += 1
+                if gone:
+                    continue
+                if url is None or url != url or np.isnat(ts):
+                    keep.append(loc)
+                    continue
+                current = latest.get(url)
+                if current is None or ts > current[0]:
+                    latest[url] = (ts, [loc])
+                elif ts == current[0]:
+                    current[1].append(loc)
+
+    #  only the columns of the files, event columns first
+    all_columns = [c for c in EVENT_COLUMNS if c in found] + \
+        [c for c in found if c not in EVENT_COLUMNS]
+
+    rows_by_file = [[] for _ in files]
+    for fi, row in keep:
+        rows_by_file[fi].append(row)
+    for _, locs in latest.values():
+        for fi, row in locs:
+            rows_by_file[fi].append(row)
+    del latest, keep
+    rows_by_file = [np.sort(np.array(rows, dtype=np.int64))
+                    for rows in rows_by_file]
+
+    if columns is None:
+        columns = all_columns
+    else:
+        columns = list(columns) + [c for c in ('URL', 'LAST_UPDATED')
+                                   if c not in columns]
+        all_columns = [c for c in all_columns if c in columns]
+        columns = all_columns
+
+    #  second pass: copy the selected rows
+    to_parquet = output.lower().endswith('.parquet')
+    writer = None
+    num_rows = 0
+    try:
+        for fi, f in enumerate(files):
+            wanted = rows_by_file[fi]
+            if len(wanted) == 0:
+                continue
+            file_columns = [c for c in snapshot_columns(f) if c in columns]
+            row = 0
+            for chunk in iter_snapshot_chunks(f, chunksize, file_columns):
+                mask = np.isin(np.arange(row, row + len(chunk)), wanted)
+                row += len(chunk)
+                if not mask.any():
+                    continue
+                chunk = chunk.loc[mask].reindex(columns=all_columns)
+                for c in LIST_COLUMNS:
+                    if c in chunk.columns:
+                        chunk[c] = [as_list(v) for v in chunk[c]]
+                chunk['LAST_UPDATED'] = pd.to_datetime(chunk['LAST_UPDATED'])
+                if to_parquet:
+                    import pyarrow.parquet as pq
+                    table = _to_table(chunk)
+                    if writer is None:
+                        writer = pq.ParquetWriter(output, table.schema,
+                                                  compression='zstd')
+                    writer.write_table(table)
+                else:
+                    chunk.to_csv(output, mode='a' if num_rows else 'w',
+                                 header=not num_rows, index=False)
+                num_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if num_rows == 0:
+        empty = pd.DataFrame(columns=all_columns)
+        if to_parquet:
+            write_parquet(empty, output)
+        else:
+            empty.to_csv(output, index=False)
+    logging.info('Merged {} snapshots into {} events in {}'.format(
+        len(files), num_rows, output))
+    return num_rows
+
+
+def convert_archive(directory=SCRAPED_DATA, remove_csv=False,
+                    overwrite=False):
+    """
+    Convert every CSV snapshot in directory into a Parquet snapshot with the
+    same name.
+
+    Parameters
+    ----------
+    directory : str, default SCRAPED_DATA
+        Directory of the snapshots.
+    remove_csv : bool, default False
+        If True each CSV file is deleted once converted.
+    overwrite : bool, default False
+        If True existing Parquet files are written again.
+
+    Returns
+    -------
+    converted : list
+        Paths of the Parquet files written.
+    """
+    converted = []
+    for fname in sorted(os.listdir(directory)):
+        if not fname.lower().endswith('.csv'):
+            continue
+        csv_path = os.path.join(directory, fname)
+        parquet_path = os.path.splitext(csv_path)[0] + '.parquet'
+        if overwrite or not os.path.exists(parquet_path):
+            write_parquet(read_snapshot(csv_path), parquet_path)
+            converted.append(parquet_path)
+            logging.info('Converted {} to {}'.format(csv_path, parquet_path))
+        if remove_csv:
+            os.remove(csv_path)
+    return converted
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert CSV snapshots to Parquet.')
+    parser.add_argument('directory', nargs='?', default=SCRAPED_DATA)
+    parser.add_argument('--remove-csv', action='store_true')
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    convert_archive(args.directory, remove_csv=args.remove_csv,
+                    overwrite=args.overwrite)
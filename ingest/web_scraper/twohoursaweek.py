@@ -1,9 +1,16 @@
+import logging
+import re
 from basewebscraper import BaseWebScraper
 
 
+FACEBOOK_HREF = re.compile('facebook.com/events')
+
+
 class TwoHoursAWeekScraper(BaseWebScraper):
     _name = 'twohoursaweek'
     _root_url = 'http://2hoursaweek.org'
+    #  extract_details() only reads the action's article
+    _parse_only = 'article'
 
     def get_event_urls(self):
         page_url = 'http://2hoursaweek.org'
@@ -33,7 +40,6 @@ class TwoHoursAWeekScraper(BaseWebScraper):
         details : dict
             Dictionary containing event-info.
         """
-        import re
         details = dict()
         details['SOURCE'] = '2hoursaweek.org'
         details['NOTES'] = 'Parsed www.2hoursaweek.org for training data'
@@ -61,7 +67,7 @@ class TwoHoursAWeekScraper(BaseWebScraper):
                        for a in art.find_all(
                            'a',
                            target='_blank',
-                           href=re.compile('facebook.com/events'))]
+                           href=FACEBOOK_HREF)]
         details['SOCIAL'] = event_links
 
         # Main Text
@@ -100,7 +106,6 @@ if __name__ == '__main__':
         - Save to CSV file
         - Find all previously saved CSV files and combine into single DataFrame
     """
-    import logging
     logging.basicConfig(level=logging.INFO)
     #  init scraper
     scraper = TwoHoursAWeekScraper()